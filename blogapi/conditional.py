@@ -0,0 +1,42 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    """Strong ETag from any reprable validator parts"""
+    digest = hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+    return quote_etag(digest)
+
+
+class ConditionalGetMixin:
+    """Answer GET with 304 Not Modified while the client's validators still match.
+
+    Views implement get_validators() to return (parts, last_modified) from cheap
+    aggregates such as row counts and max(updated_at); nothing is serialized when
+    the ETag matches. The ETag also covers the query string and the viewer, since
+    both change the payload. If-Modified-Since is only honoured where
+    last_modified alone captures every change (set honor_if_modified_since).
+    """
+    honor_if_modified_since = False
+
+    def get_validators(self):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        parts, last_modified = self.get_validators()
+        etag = make_etag(request.get_full_path(), request.user.pk, last_modified, *parts)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        not_modified = get_conditional_response(
+            request, etag=etag,
+            last_modified=timestamp if self.honor_if_modified_since else None,
+        )
+        response = not_modified or super().get(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+            patch_vary_headers(response, ['Authorization'])
+        return response
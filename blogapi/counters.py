@@ -0,0 +1,15 @@
+class CounterFieldsMixin:
+    """Keep a model's COUNTER_FIELDS out of plain saves of existing rows.
+
+    Counters only move through F() updates, so an instance loaded before one of
+    them must not write its stale value back. Saves that pass update_fields, and
+    inserts, are left alone."""
+    COUNTER_FIELDS = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
@@ -0,0 +1,88 @@
+from rest_framework.exceptions import ValidationError
+
+
+class SparseFieldsetMixin:
+    """Serializer mixin for ?fields=a,b and ?view=<name> sparse fieldsets.
+
+    Named views are declared in Meta.views. Fields listed in Meta.optional_fields
+    only appear when a fieldset asks for them, so the default payload is unchanged.
+    The selection arrives through context['requested_fields'] (None = default
+    payload) so the view can also trim its query with model_columns().
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = self.context.get('requested_fields')
+        optional = set(getattr(self.Meta, 'optional_fields', ()))
+        for name in list(self.fields):
+            keep = name not in optional if requested is None else name in requested
+            if not keep:
+                self.fields.pop(name)
+
+    @classmethod
+    def parse_requested_fields(cls, request):
+        """The set of field names a request selects, or None for the default payload"""
+        if request is None:
+            return None
+        available = set(cls.Meta.fields)
+        selected = None
+        view = request.query_params.get('view')
+        if view:
+            views = getattr(cls.Meta, 'views', {})
+            if view not in views:
+                raise ValidationError({'view': f'Unknown view. Choose from: {", ".join(sorted(views))}'})
+            selected = set(views[view])
+        fields = request.query_params.get('fields')
+        if fields:
+            names = {name.strip() for name in fields.split(',') if name.strip()}
+            unknown = names - available
+            if unknown:
+                raise ValidationError({'fields': f'Unknown field(s): {", ".join(sorted(unknown))}'})
+            selected = names if selected is None else selected & names
+        return selected
+
+    @classmethod
+    def model_columns(cls, requested):
+        """Model fields that must be loaded to render the requested serializer fields.
+
+        Sources of method fields are declared in Meta.field_sources."""
+        model = cls.Meta.model
+        concrete = {field.name for field in model._meta.concrete_fields}
+        declared = getattr(cls.Meta, 'field_sources', {})
+        fields = cls(context={'requested_fields': set(cls.Meta.fields)}).fields
+        columns = {model._meta.pk.name}
+        for name in requested:
+            if name in declared:
+                sources = declared[name]
+            else:
+                sources = [fields[name].source]
+            columns.update(source.split('.')[0] for source in sources if source.split('.')[0] in concrete)
+        return columns
+
+
+class SparseFieldsetViewMixin:
+    """View side of SparseFieldsetMixin: passes the selection to the serializer"""
+
+    def get_requested_fields(self):
+        if not hasattr(self, '_requested_fields'):
+            self._requested_fields = self.get_serializer_class().parse_requested_fields(self.request)
+        return self._requested_fields
+
+    def wants_field(self, name):
+        requested = self.get_requested_fields()
+        return requested is None or name in requested
+
+    def trim_queryset(self, queryset):
+        """Load only the columns the selected fields read"""
+        requested = self.get_requested_fields()
+        if requested is None:
+            return queryset
+        columns = self.get_serializer_class().model_columns(requested)
+        # Keyset cursors are built from the ordering columns, so those always load
+        columns.update(field.lstrip('-') for field in getattr(self, 'keyset_ordering', ()))
+        return queryset.only(*columns)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['requested_fields'] = self.get_requested_fields()
+        return context
@@ -0,0 +1,124 @@
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Seek pagination over a unique, non-null composite ordering such as
+    ('-published_at', '-id'). Each page is a range scan on the matching index,
+    so page 10,000 costs the same as page 1 and no COUNT(*) is run."""
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+    signer = signing.Signer(salt='blogapi.pagination.keyset')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = tuple(getattr(view, 'keyset_ordering', self.ordering))
+        self.model = queryset.model
+        self.fields = [queryset.model._meta.get_field(self._name(field)) for field in self.ordering]
+        position, reverse = self.decode_cursor(request)
+
+        ordering = self._flip(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._seek(ordering, position))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self._link(self.page[0], reverse=True)
+
+    def encode_cursor(self, obj, reverse):
+        if isinstance(obj, dict):
+            # A row from a .values() queryset (blogapi.rows)
+            obj = self.model(**{field.attname: obj[field.name] for field in self.fields})
+        position = [field.value_to_string(obj) for field in self.fields]
+        return self.signer.sign_object([position, int(reverse)])
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            position, reverse = self.signer.unsign_object(token)
+            values = [field.to_python(value) for field, value in zip(self.fields, position, strict=True)]
+        except (signing.BadSignature, ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return values, bool(reverse)
+
+    def _link(self, obj, reverse):
+        url = remove_query_param(self.base_url, 'page')
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(obj, reverse))
+
+    def _seek(self, ordering, values):
+        # Leading-column bound keeps the range scan on the index; the OR tree breaks ties
+        first = ordering[0]
+        bound = Q(**{f'{self._name(first)}__{"lte" if first.startswith("-") else "gte"}': values[0]})
+        after = Q()
+        for i, field in enumerate(ordering):
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            clause = Q(**{f'{self._name(field)}__{lookup}': values[i]})
+            for previous, value in zip(ordering[:i], values[:i]):
+                clause &= Q(**{self._name(previous): value})
+            after |= clause
+        return bound & after
+
+    @staticmethod
+    def _name(field):
+        return field.lstrip('-')
+
+    @staticmethod
+    def _flip(ordering):
+        return tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+
+
+class HybridPagination(PageNumberPagination):
+    """Page numbers by default. Views that declare a keyset_ordering switch to
+    keyset pagination when the client asks with ?pagination=cursor or follows
+    a cursor link."""
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        wants_cursor = (request.query_params.get('pagination') == 'cursor'
+                        or self.keyset_class.cursor_query_param in request.query_params)
+        if wants_cursor and getattr(view, 'keyset_ordering', None):
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
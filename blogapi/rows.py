@@ -0,0 +1,136 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.response import Response
+
+
+# Fields whose representation of a database value is the value itself
+IDENTITY_FIELDS = (
+    serializers.ReadOnlyField, serializers.CharField, serializers.IntegerField,
+    serializers.BooleanField, serializers.PrimaryKeyRelatedField,
+)
+
+
+class RowSerializer:
+    """Read-only, precompiled twin of a ModelSerializer that renders .values() rows.
+
+    The field list, the column behind each field and its value converter are
+    worked out once, when the RowSerializer is built, instead of once per object;
+    rows are plain dicts, so a page renders without model instances or DRF's
+    per-field machinery. The output matches serializer_class field for field,
+    including sparse fieldsets picked through context['requested_fields'].
+
+    Nested serializers read prefixed columns (author__username). Values for
+    SerializerMethodFields come from the `methods` passed to render(): a map of
+    field name to callable(row).
+    """
+
+    def __init__(self, serializer_class, context=None):
+        self.context = context or {}
+        self.request = self.context.get('request')
+        self.columns = []
+        self.plan = self._compile(serializer_class(context=self.context), '')
+
+    def _compile(self, serializer, prefix):
+        pk = serializer.Meta.model._meta.pk.name
+        self.columns.append(prefix + pk)
+        plan = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.SerializerMethodField):
+                plan.append((name, self._method(name)))
+                continue
+            column = prefix + field.source.replace('.', '__')
+            if isinstance(field, serializers.BaseSerializer):
+                if getattr(field, 'many', False):
+                    raise ImproperlyConfigured(f'{name}: nested many=True serializers have no row form')
+                nested = self._compile(field, column + '__')
+                plan.append((name, self._nested(column + '__' + field.Meta.model._meta.pk.name, nested)))
+                continue
+            self.columns.append(column)
+            if isinstance(field, serializers.FileField):
+                convert = self._file_url(field)
+            elif isinstance(field, IDENTITY_FIELDS):
+                convert = None
+            else:
+                convert = field.to_representation
+            plan.append((name, self._value(column, convert)))
+        return plan
+
+    @staticmethod
+    def _value(column, convert):
+        if convert is None:
+            return lambda row, methods: row[column]
+
+        def render(row, methods):
+            value = row[column]
+            return None if value is None else convert(value)
+        return render
+
+    @staticmethod
+    def _nested(pk_column, plan):
+        def render(row, methods):
+            if row[pk_column] is None:
+                return None
+            return {name: field(row, methods) for name, field in plan}
+        return render
+
+    @staticmethod
+    def _method(name):
+        def render(row, methods):
+            if name not in methods:
+                raise ImproperlyConfigured(f'No row method given for {name}')
+            return methods[name](row)
+        return render
+
+    def _file_url(self, field):
+        # Same as FileField.to_representation, from the stored file name
+        storage = field.parent.Meta.model._meta.get_field(field.source).storage
+        use_url = getattr(field, 'use_url', True)
+        request = self.request
+
+        def convert(name):
+            if not name:
+                return None
+            if not use_url:
+                return name
+            url = storage.url(name)
+            return request.build_absolute_uri(url) if request is not None else url
+        return convert
+
+    def to_representation(self, row, methods=None):
+        methods = methods or {}
+        return {name: field(row, methods) for name, field in self.plan}
+
+    def render(self, rows, methods=None):
+        methods = methods or {}
+        plan = self.plan
+        return [{name: field(row, methods) for name, field in plan} for row in rows]
+
+
+class RowSerializationMixin:
+    """List views that render pages with a RowSerializer instead of their serializer.
+
+    The view's queryset is read with .values() and rendered from the compiled
+    plan; views fill SerializerMethodFields for a page through
+    get_row_methods(rows). Switched off globally with FAST_READ_SERIALIZERS = False.
+    """
+
+    def get_row_methods(self, rows):
+        return {}
+
+    def list(self, request, *args, **kwargs):
+        if not getattr(settings, 'FAST_READ_SERIALIZERS', True):
+            return super().list(request, *args, **kwargs)
+        row_serializer = RowSerializer(self.get_serializer_class(), self.get_serializer_context())
+        ordering = [field.lstrip('-') for field in getattr(self, 'keyset_ordering', ())]
+        columns = dict.fromkeys([*row_serializer.columns, *ordering])
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None).values(*columns)
+
+        page = self.paginate_queryset(queryset)
+        rows = list(queryset) if page is None else page
+        data = row_serializer.render(rows, self.get_row_methods(rows))
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
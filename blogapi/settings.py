@@ -1,4 +1,5 @@
 import os
+from datetime import timedelta
 from pathlib import Path
 from dotenv import load_dotenv
 load_dotenv()
@@ -7,7 +8,6 @@ load_dotenv()
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
 
@@ -48,16 +48,80 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.StatelessJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'blogapi.pagination.HybridPagination',
     'PAGE_SIZE': 10,
 }
 
-from datetime import timedelta
+# Render the post and promotion lists from .values() rows (blogapi.rows); False uses the DRF serializers
+FAST_READ_SERIALIZERS = True
+
+# Notification fan-out (blogapp.notifications). Requests publish events that a background
+# thread delivers in batches; with ASYNC off they are delivered on commit (as the test runner does).
+NOTIFICATIONS = {
+    'ASYNC': True,
+    'BATCH_SIZE': 100,
+    'FLUSH_INTERVAL': 0.5,
+    'MAX_RETRIES': 3,
+    'RETRY_BACKOFF': 0.5,
+    # Unread notifications of these types on the same post collapse into one ("alice and 3 others ...")
+    'AGGREGATE_TYPES': ('like', 'comment'),
+    'AGGREGATION_WINDOW': timedelta(days=1),
+    # prune_notifications: read notifications older than this go; each user keeps at most MAX_PER_USER
+    'READ_RETENTION': timedelta(days=30),
+    'MAX_PER_USER': 500,
+}
+
+# Server-sent event streams (blogapp.streams); serve the project over ASGI to use them
+STREAMS = {
+    'KEEPALIVE': 15,
+    'RETRY_MS': 3000,
+    # Events buffered per connection before a slow client is dropped and left to resume
+    'QUEUE_SIZE': 100,
+    # Rows replayed after Last-Event-ID before the client is told to reload instead
+    'REPLAY_LIMIT': 100,
+    # Seconds a ?stream_token= from POST /api/notifications/stream/token/ can open a stream
+    'TOKEN_TTL': 60,
+}
+
+# Bounds for nested reply trees; clients pick within them via ?depth= and ?replies=
+COMMENT_THREADS = {
+    'DEFAULT_DEPTH': 3,
+    'MAX_DEPTH': 10,
+    'DEFAULT_REPLIES': 10,
+    'MAX_REPLIES': 100,
+}
+
+# Full user rows for claim-built request users (users.authentication), per process
+USER_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 60,
+}
+
+# Password checks for the async login view (users.login): hashing threads, plus logins
+# allowed to wait for one before the view answers 503
+LOGIN_HASHING = {
+    'WORKERS': os.cpu_count() or 1,
+    'QUEUE_SIZE': 32,
+    'RETRY_AFTER': 1,
+}
+
+# Revoked tokens (users.revocation): in-memory Bloom filter synced from the TokenRevocation table
+TOKEN_REVOCATION = {
+    'CAPACITY': 100000,
+    'FALSE_POSITIVE_RATE': 0.001,
+    # Seconds before a process sees revocations made by other processes
+    'SYNC_INTERVAL': 5,
+    # Seconds of rows each sync re-reads, for revocations that commit after newer ones
+    'SYNC_OVERLAP': 60,
+    # Seconds between full rebuilds, which drop compacted rows from the filter
+    'REBUILD_INTERVAL': 600,
+}
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
@@ -116,6 +180,52 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'blogapi',
+    }
+}
+# Share the cache between processes: Redis in production, a directory as a single-host stand-in
+if os.getenv('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL'),
+    }
+elif os.getenv('CACHE_DIR'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('CACHE_DIR'),
+    }
+
+# Promotion pages (promotions.cache): a process-local LRU in front of CACHES[ALIAS]. Local copies
+# live LOCAL_TTL seconds; entries are rebuilt after SOFT_TTL, served stale meanwhile, gone after HARD_TTL
+PROMOTION_CACHE = {
+    'ALIAS': 'default',
+    'LOCAL_MAX_SIZE': 1000,
+    'LOCAL_TTL': 5,
+    'SOFT_TTL': 60,
+    'HARD_TTL': 3600,
+}
+
+# GET /api/promotions/serve/ (promotions.serving): the weighted table is checked against the promotion
+# cache generation every CHECK_INTERVAL seconds; impressions and clicks are written every FLUSH_INTERVAL
+PROMOTION_SERVING = {
+    'CHECK_INTERVAL': 1,
+    'FLUSH_INTERVAL': 10,
+    'BACKGROUND_FLUSH': True,
+}
+
+# Runs notification delivery and promotion counter flushes inline under test
+TEST_RUNNER = 'blogapi.test_runner.SynchronousTestRunner'
+
+# Seconds a rendered post detail stays cached; writes invalidate it sooner
+POST_DETAIL_CACHE_TIMEOUT = 300
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -0,0 +1,90 @@
+from django.contrib.auth import get_user_model
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+from users.serializers import UserDetailSerializer
+
+
+def _users():
+    return get_user_model().objects.all(), UserDetailSerializer
+
+
+# Collections a response can sideload with ?include=<name>: name -> () -> (queryset, serializer class)
+SIDELOADS = {
+    'users': _users,
+}
+
+
+class SideloadedIdField(serializers.Field):
+    """Renders a related row's id and records it for the response's top-level map"""
+
+    def __init__(self, collection, **kwargs):
+        kwargs['read_only'] = True
+        self.collection = collection
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        self.context['sideload'][self.collection].add(value)
+        return value
+
+
+class SideloadMixin:
+    """Serializer mixin for compound documents.
+
+    Meta.sideload maps a nested field to a collection, e.g. {'author': 'users'}.
+    When context['sideload'] holds that collection, the nested object is
+    replaced by an <field>_id reference and the id is collected; the view then
+    loads each referenced row once (SideloadViewMixin).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        sideload = self.context.get('sideload')
+        if not sideload:
+            return
+        for name, collection in getattr(self.Meta, 'sideload', {}).items():
+            if collection in sideload and name in self.fields:
+                self.fields.pop(name)
+                self.fields[f'{name}_id'] = SideloadedIdField(collection)
+
+
+class SideloadViewMixin:
+    """View side of SideloadMixin: ?include=users adds a top-level users map to
+    a list response, fetched in one query per collection. Set
+    sideload_query_param = None on views whose payload has no top level to add to."""
+    sideload_query_param = 'include'
+
+    def get_sideloads(self):
+        if not hasattr(self, '_sideloads'):
+            raw = self.request.query_params.get(self.sideload_query_param, '') if self.sideload_query_param else ''
+            names = {name.strip() for name in raw.split(',') if name.strip()}
+            unknown = names - set(SIDELOADS)
+            if unknown:
+                raise ValidationError({self.sideload_query_param: f'Unknown collection(s): {", ".join(sorted(unknown))}'})
+            # Filled with referenced ids while the page is serialized
+            self._sideloads = {name: set() for name in names}
+        return self._sideloads
+
+    def is_sideloaded(self, collection):
+        """Whether rows of collection are referenced by id instead of rendered inline"""
+        return collection in self.get_sideloads()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['sideload'] = self.get_sideloads()
+        return context
+
+    def load_sideloads(self):
+        included = {}
+        for name, ids in self.get_sideloads().items():
+            queryset, serializer_class = SIDELOADS[name]()
+            rows = list(queryset.filter(pk__in=ids)) if ids else []
+            data = serializer_class(rows, many=True, context={'request': self.request}).data
+            included[name] = {row.pk: item for row, item in zip(rows, data)}
+        return included
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if response.status_code == 200 and isinstance(response.data, dict) and getattr(self, '_sideloads', None):
+            response.data.update(self.load_sideloads())
+        return response
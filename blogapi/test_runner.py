@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class SynchronousTestRunner(DiscoverRunner):
+    """DiscoverRunner without background threads: notifications are delivered on
+    commit and promotion counters are only written by explicit flushes, so tests
+    can assert on both."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.synchronous = override_settings(
+            NOTIFICATIONS={**settings.NOTIFICATIONS, 'ASYNC': False},
+            PROMOTION_SERVING={**settings.PROMOTION_SERVING, 'BACKGROUND_FLUSH': False},
+        )
+        self.synchronous.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.synchronous.disable()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,135 @@
+import hashlib
+import threading
+import time
+
+from django.core.cache import caches
+
+from .lrucache import TTLCache
+
+
+class _Flight:
+    """One in-progress build that concurrent callers for the same key wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.entry = None
+
+
+class TieredCache:
+    """Process-local LRU in front of a shared Django cache, for hot payloads that rarely change.
+
+    get(key, build) serves from the local tier, then the shared one, and only
+    calls build() on a miss in both. Misses are coalesced: within a process one
+    thread builds while the rest wait for its result, and across processes a
+    short lock in the shared cache lets one process build while the others
+    poll for the value. Entries are fresh for soft_ttl seconds; after that the
+    first caller to take the lock rebuilds while everyone else keeps getting the
+    stale value (stale-while-revalidate) until the shared copy expires at
+    hard_ttl. invalidate() bumps a generation kept in the shared cache, which
+    orphans every entry at once; other processes drop their local copies within
+    local_ttl seconds.
+    """
+
+    def __init__(self, namespace, alias='default', local_max_size=1000, local_ttl=5, soft_ttl=60,
+                 hard_ttl=3600, lock_timeout=10, poll_interval=0.05):
+        self.namespace = namespace
+        self.alias = alias
+        self.local = TTLCache(max_size=local_max_size, ttl=local_ttl)
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = hard_ttl
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.flights = {}
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def generation(self):
+        """Current generation; it changes on every invalidate(), in any process sharing the cache"""
+        key = f'{self.namespace}:generation'
+        generation = self.shared.get(key)
+        if generation is None:
+            self.shared.add(key, 1, None)
+            generation = self.shared.get(key, 1)
+        return generation
+
+    def _shared_key(self, key):
+        digest = hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
+        return f'{self.namespace}:{self.generation()}:{digest}'
+
+    def get(self, key, build):
+        entry = self.local.get(key)
+        if entry is None:
+            shared_key = self._shared_key(key)
+            entry = self.shared.get(shared_key) or self._fill(key, shared_key, build)
+            self.local.set(key, entry)
+        if entry['fresh_until'] <= time.time():
+            entry = self._revalidate(key, entry, build)
+        return entry['value']
+
+    def _store(self, key, shared_key, value):
+        entry = {'value': value, 'fresh_until': time.time() + self.soft_ttl}
+        self.shared.set(shared_key, entry, self.hard_ttl)
+        self.local.set(key, entry)
+        return entry
+
+    def _fill(self, key, shared_key, build):
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = _Flight()
+        if not leader:
+            flight.done.wait(self.lock_timeout)
+            if flight.entry is not None:
+                return flight.entry
+            # The leader failed or is stuck; build for ourselves
+            return self._store(key, shared_key, build())
+        try:
+            flight.entry = self._fill_shared(key, shared_key, build)
+            return flight.entry
+        finally:
+            flight.done.set()
+            with self.lock:
+                self.flights.pop(key, None)
+
+    def _fill_shared(self, key, shared_key, build):
+        lock_key = f'{shared_key}:lock'
+        deadline = time.monotonic() + self.lock_timeout
+        while not self.shared.add(lock_key, 1, self.lock_timeout):
+            if time.monotonic() >= deadline:
+                return self._store(key, shared_key, build())
+            time.sleep(self.poll_interval)
+            entry = self.shared.get(shared_key)
+            if entry is not None:
+                return entry
+        try:
+            return self.shared.get(shared_key) or self._store(key, shared_key, build())
+        finally:
+            self.shared.delete(lock_key)
+
+    def _revalidate(self, key, stale, build):
+        """A newer entry from the shared tier, a rebuilt one, or stale while someone else rebuilds"""
+        shared_key = self._shared_key(key)
+        current = self.shared.get(shared_key)
+        if current is not None and current['fresh_until'] > stale['fresh_until']:
+            self.local.set(key, current)
+            return current
+        lock_key = f'{shared_key}:lock'
+        if not self.shared.add(lock_key, 1, self.lock_timeout):
+            return stale
+        try:
+            return self._store(key, shared_key, build())
+        finally:
+            self.shared.delete(lock_key)
+
+    def invalidate(self):
+        """Orphan every entry, in the shared tier and in this process"""
+        key = f'{self.namespace}:generation'
+        try:
+            self.shared.incr(key)
+        except ValueError:
+            self.shared.set(key, 2, None)
+        self.local.clear()
@@ -1,5 +1,10 @@
 from django.contrib import admin
-from .models import BlogPost, Comment, Notification
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import BackfillCheckpoint, BlogPost, Comment, Notification
+from . import notifications, search, streams
+from .cache import invalidate_posts
 
 @admin.register(BlogPost)
 class BlogPostAdmin(admin.ModelAdmin):
@@ -17,6 +22,15 @@ class BlogPostAdmin(admin.ModelAdmin):
             'fields': ('author', 'status', 'read_time', 'published_at')
         }),
     )
+    
+    search_result_limit = 1000
+    
+    def get_search_results(self, request, queryset, search_term):
+        # Text fields go through the full-text index instead of LIKE '%...%' scans
+        if not search_term:
+            return queryset, False
+        post_ids = search.search_ids(search_term, status=None, limit=self.search_result_limit)
+        return queryset.filter(Q(id__in=post_ids) | Q(author__username__icontains=search_term)), False
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
@@ -27,12 +41,24 @@ class CommentAdmin(admin.ModelAdmin):
     
     actions = ['approve_comments', 'disapprove_comments']
     
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if obj.is_approved and 'is_approved' in form.changed_data:
+            transaction.on_commit(lambda: streams.publish_comments([obj.id]))
+    
     def approve_comments(self, request, queryset):
-        queryset.update(is_approved=True)
+        # updated_at moves so streams resuming from Last-Event-ID pick the comments up
+        approved = dict(queryset.filter(is_approved=False).values_list('id', 'blog_post_id'))
+        Comment.objects.filter(id__in=approved).update(is_approved=True, updated_at=timezone.now())
+        # Bulk updates send no post_save, so cached post details are dropped here
+        invalidate_posts(approved.values())
+        transaction.on_commit(lambda: streams.publish_comments(list(approved)))
     approve_comments.short_description = "Approve selected comments"
     
     def disapprove_comments(self, request, queryset):
-        queryset.update(is_approved=False)
+        disapproved = dict(queryset.filter(is_approved=True).values_list('id', 'blog_post_id'))
+        Comment.objects.filter(id__in=disapproved).update(is_approved=False, updated_at=timezone.now())
+        invalidate_posts(disapproved.values())
     disapprove_comments.short_description = "Disapprove selected comments"
 
 @admin.register(Notification)
@@ -44,10 +70,22 @@ class NotificationAdmin(admin.ModelAdmin):
     
     actions = ['mark_as_read', 'mark_as_unread']
     
+    def set_read(self, queryset, is_read):
+        # Keep the recipients' unread counters in step with the rows
+        with transaction.atomic():
+            recipients = set(queryset.values_list('recipient_id', flat=True))
+            queryset.update(is_read=is_read, updated_at=timezone.now())
+            notifications.recount_unread(recipients)
+    
     def mark_as_read(self, request, queryset):
-        queryset.update(is_read=True)
+        self.set_read(queryset, True)
     mark_as_read.short_description = "Mark selected notifications as read"
     
     def mark_as_unread(self, request, queryset):
-        queryset.update(is_read=False)
-    mark_as_unread.short_description = "Mark selected notifications as unread"
\ No newline at end of file
+        self.set_read(queryset, False)
+    mark_as_unread.short_description = "Mark selected notifications as unread"
+
+@admin.register(BackfillCheckpoint)
+class BackfillCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('name', 'last_pk', 'processed', 'changed', 'updated_at', 'completed_at')
+    readonly_fields = ('name', 'last_pk', 'processed', 'changed', 'started_at', 'updated_at', 'completed_at')
@@ -0,0 +1,181 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cache import invalidate_post
+from .notifications import _unread_for_user, recount_unread
+from .models import BackfillCheckpoint, BlogPost, Comment, Notification
+
+# Online backfills: long data migrations that walk a table in primary-key chunks,
+# one short transaction per chunk, and record a checkpoint after each so they can
+# be stopped and resumed while the site keeps serving. Apps register jobs in a
+# backfills module; `python manage.py backfill` discovers and runs them.
+
+registry = {}
+
+
+def register(job_class):
+    registry[job_class.name] = job_class
+    return job_class
+
+
+def repair_post_counters(post_ids):
+    """Recount the posts' engagement counters and drop their cached details.
+
+    Shared by the post_counters backfill and reconcile_counters. The recount
+    runs inside the UPDATE, so concurrent F() increments are not overwritten."""
+    BlogPost.objects.filter(pk__in=post_ids).recount()
+    for post_id in post_ids:
+        invalidate_post(post_id)
+
+
+class Backfill:
+    """One backfill job. Subclasses set name and model and implement process()."""
+    name = None
+    model = None
+    description = ''
+    # Columns loaded for each chunk; None loads whole rows
+    fields = None
+
+    def get_queryset(self):
+        """Rows still to visit; the runner adds the pk range and ordering"""
+        return self.model._default_manager.all()
+
+    def process(self, batch, dry_run):
+        """Fix one chunk of rows and return how many changed (or would change)"""
+        raise NotImplementedError
+
+
+class BackfillRunner:
+    """Drive a job over its table in pk order from the last checkpoint"""
+
+    def __init__(self, job, batch_size=1000, sleep=0.0, dry_run=False, max_batches=None, progress=None):
+        self.job = job
+        self.batch_size = batch_size
+        self.sleep = sleep
+        self.dry_run = dry_run
+        self.max_batches = max_batches
+        self.progress = progress
+
+    def load_checkpoint(self, restart=False):
+        if self.dry_run:
+            # Dry runs start from the stored checkpoint but never move it
+            checkpoint = (BackfillCheckpoint.objects.filter(name=self.job.name).first()
+                          or BackfillCheckpoint(name=self.job.name))
+        else:
+            checkpoint, _ = BackfillCheckpoint.objects.get_or_create(name=self.job.name)
+        if restart:
+            checkpoint.last_pk = checkpoint.processed = checkpoint.changed = 0
+        checkpoint.completed_at = None
+        return checkpoint
+
+    def run(self, restart=False):
+        checkpoint = self.load_checkpoint(restart)
+        queryset = self.job.get_queryset().order_by('pk')
+        if self.job.fields is not None:
+            queryset = queryset.only(*self.job.fields)
+        max_pk = self.job.model._default_manager.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+        batches = 0
+        while self.max_batches is None or batches < self.max_batches:
+            with transaction.atomic():
+                batch = list(queryset.filter(pk__gt=checkpoint.last_pk)[:self.batch_size])
+                if not batch:
+                    checkpoint.completed_at = timezone.now()
+                    if not self.dry_run:
+                        checkpoint.save()
+                    break
+                changed = self.job.process(batch, self.dry_run)
+                checkpoint.last_pk = batch[-1].pk
+                checkpoint.processed += len(batch)
+                checkpoint.changed += changed
+                if not self.dry_run:
+                    checkpoint.save()
+            batches += 1
+            if self.progress:
+                self.progress(checkpoint, max_pk)
+            if self.sleep:
+                time.sleep(self.sleep)
+        return checkpoint
+
+
+@register
+class CommentPathBackfill(Backfill):
+    name = 'comment_paths'
+    model = Comment
+    description = 'Fill the materialized path and depth of comments that have none'
+    fields = ('id', 'parent_id', 'path', 'depth')
+
+    def get_queryset(self):
+        return Comment.objects.filter(path='')
+
+    def process(self, batch, dry_run):
+        # Replies always have a higher id than their parent, so pk order sees parents first
+        known = {
+            row['id']: (row['path'], row['depth'])
+            for row in Comment.objects.filter(pk__in={c.parent_id for c in batch if c.parent_id})
+            .exclude(path='').values('id', 'path', 'depth')
+        }
+        for comment in batch:
+            prefix, depth = known.get(comment.parent_id, ('', -1))
+            comment.path = f'{prefix}{comment.id:0{Comment.PATH_SEGMENT_WIDTH}d}/'
+            comment.depth = depth + 1
+            known[comment.id] = (comment.path, comment.depth)
+        if not dry_run:
+            Comment.objects.bulk_update(batch, ['path', 'depth'])
+        return len(batch)
+
+
+@register
+class PostCounterBackfill(Backfill):
+    name = 'post_counters'
+    model = BlogPost
+    description = 'Recompute like, bookmark and comment counters from users_like, users_bookmark and blogapp_comment'
+    fields = ('id',)
+
+    def process(self, batch, dry_run):
+        drifted = list(BlogPost.objects.filter(pk__in=[post.pk for post in batch]).drifted()
+                       .values_list('pk', flat=True))
+        if drifted and not dry_run:
+            repair_post_counters(drifted)
+        return len(drifted)
+
+
+@register
+class NotificationRetentionBackfill(Backfill):
+    name = 'notification_retention'
+    model = Notification
+    description = 'Delete read notifications older than NOTIFICATIONS["READ_RETENTION"]'
+    fields = ('id',)
+
+    def get_queryset(self):
+        cutoff = timezone.now() - settings.NOTIFICATIONS['READ_RETENTION']
+        return Notification.objects.filter(is_read=True, updated_at__lt=cutoff)
+
+    def process(self, batch, dry_run):
+        if not dry_run:
+            Notification.objects.filter(pk__in=[notification.pk for notification in batch]).delete()
+        return len(batch)
+
+
+@register
+class UnreadNotificationCountBackfill(Backfill):
+    name = 'unread_notification_counts'
+    model = get_user_model()
+    description = 'Recompute User.unread_notifications from blogapp_notification'
+    fields = ('id',)
+
+    def process(self, batch, dry_run):
+        drifted = list(
+            self.model.objects.filter(pk__in=[user.pk for user in batch])
+            .annotate(actual_unread=_unread_for_user())
+            .exclude(unread_notifications=F('actual_unread'))
+            .values_list('pk', flat=True)
+        )
+        if drifted and not dry_run:
+            recount_unread(drifted)
+        return len(drifted)
@@ -0,0 +1,101 @@
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from blogapi.conditional import make_etag
+from .engagement import viewer_state
+
+# Rendered post details are cached by post id, with a slug -> id pointer in front.
+# Per-viewer like/bookmark flags live under their own keys so one shared payload
+# serves every reader. Every invalidation also moves the feed version, which the
+# post list uses as its validator instead of aggregating over the posts.
+
+FEED_VERSION_KEY = 'blogapp:feed-version'
+
+
+def _detail_key(post_id):
+    return f'blogapp:post-detail:{post_id}'
+
+
+def _slug_key(slug):
+    return f'blogapp:post-slug:{slug}'
+
+
+def _viewer_key(post_id, user_id):
+    return f'blogapp:post-viewer:{post_id}:{user_id}'
+
+
+def get_post_detail(slug):
+    """The cached {'data': payload, 'etag': ...} entry for a slug, or None"""
+    post_id = cache.get(_slug_key(slug))
+    if post_id is None:
+        return None
+    entry = cache.get(_detail_key(post_id))
+    # A renamed post leaves its old slug pointer behind; never serve it under that slug
+    if entry is None or entry['data']['slug'] != slug:
+        return None
+    return entry
+
+
+def set_post_detail(payload):
+    """Cache a rendered payload along with an ETag computed once, at render time"""
+    entry = {'data': dict(payload), 'etag': make_etag(payload)}
+    cache.set_many({
+        _slug_key(payload['slug']): payload['id'],
+        _detail_key(payload['id']): entry,
+    }, settings.POST_DETAIL_CACHE_TIMEOUT)
+    return entry
+
+
+def get_viewer_overlay(user, post_id):
+    """is_liked / is_bookmarked for one viewer, cached separately from the shared payload"""
+    if not user.is_authenticated:
+        return {'is_liked': False, 'is_bookmarked': False}
+    key = _viewer_key(post_id, user.pk)
+    overlay = cache.get(key)
+    if overlay is None:
+        state = viewer_state(user, [post_id])
+        overlay = {'is_liked': post_id in state['liked'], 'is_bookmarked': post_id in state['bookmarked']}
+        cache.set(key, overlay, settings.POST_DETAIL_CACHE_TIMEOUT)
+    return overlay
+
+
+def invalidate_post(post_id, slug=None, viewer_id=None):
+    """Drop cached entries for a post once the surrounding transaction commits,
+    so a concurrent reader cannot refill the cache from pre-commit data"""
+    keys = [_detail_key(post_id)]
+    if slug:
+        keys.append(_slug_key(slug))
+    if viewer_id is not None:
+        keys.append(_viewer_key(post_id, viewer_id))
+    transaction.on_commit(lambda: _drop(keys))
+
+
+def invalidate_posts(post_ids):
+    """invalidate_post for many posts at once, for bulk updates that send no signals"""
+    keys = [_detail_key(post_id) for post_id in set(post_ids)]
+    if keys:
+        transaction.on_commit(lambda: _drop(keys))
+
+
+def _drop(keys):
+    cache.delete_many(keys)
+    cache.set(FEED_VERSION_KEY, _new_feed_version(), None)
+
+
+def _new_feed_version():
+    # Random rather than incremented: a version lost to eviction can never come back
+    return {'version': uuid4().hex, 'changed_at': timezone.now()}
+
+
+def get_feed_version():
+    """{'version', 'changed_at'} of everything the post list renders: posts, comments,
+    counters and the embedded users all change through invalidate_post(s)"""
+    entry = cache.get(FEED_VERSION_KEY)
+    if entry is None:
+        cache.add(FEED_VERSION_KEY, _new_feed_version(), None)
+        entry = cache.get(FEED_VERSION_KEY)
+    return entry
@@ -0,0 +1,14 @@
+from users.models import Like, Bookmark
+
+
+def viewer_state(user, post_ids):
+    """The subsets of post_ids the user has liked and bookmarked: one query per table"""
+    post_ids = list(post_ids)
+    if user is None or not user.is_authenticated or not post_ids:
+        return {'liked': set(), 'bookmarked': set()}
+    return {
+        'liked': set(Like.objects.filter(user=user, blog_post_id__in=post_ids)
+                     .values_list('blog_post_id', flat=True)),
+        'bookmarked': set(Bookmark.objects.filter(user=user, blog_post_id__in=post_ids)
+                          .values_list('blog_post_id', flat=True)),
+    }
@@ -0,0 +1,140 @@
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from users.models import Like, Bookmark
+from . import notifications
+from .cache import invalidate_post
+from .models import BlogPost, PendingEngagement
+
+# Set-based like/bookmark writes. Toggles are collapsed to one final state per
+# (user, post, kind) and applied with one bulk insert and one delete per table.
+# Counters move by the rows actually inserted and deleted, one UPDATE per
+# distinct delta, so applying the same toggles twice leaves the same rows and
+# counts behind; full recounts are left to reconcile_counters.
+
+MODELS = {'like': Like, 'bookmark': Bookmark}
+
+APPLIED = 'applied'
+UNCHANGED = 'unchanged'
+MISSING_POST = 'missing_post'
+
+
+def apply_toggles(toggles):
+    """Apply {(user_id, post_id, kind): 'add' | 'remove'} and return the outcome of each.
+
+    Callers hold the transaction. New likes notify the post author once it
+    commits, as the like endpoint does."""
+    post_ids = {post_id for _, post_id, _ in toggles}
+    posts = set(BlogPost.objects.filter(id__in=post_ids).values_list('id', flat=True))
+    results = {}
+    new_likes = []
+
+    for kind, model in MODELS.items():
+        wanted = {(user_id, post_id): action for (user_id, post_id, k), action in toggles.items()
+                  if k == kind and post_id in posts}
+        if not wanted:
+            continue
+        existing = _existing_pairs(model, wanted)
+        created = _insert_pairs(model, [pair for pair, action in wanted.items()
+                                        if action == 'add' and pair not in existing])
+        removed = [pair for pair, action in wanted.items() if action == 'remove' and pair in existing]
+
+        if removed:
+            condition = Q()
+            for user_id, post_id in removed:
+                condition |= Q(user_id=user_id, blog_post_id=post_id)
+            model.objects.filter(condition).delete()
+
+        changed = set(created) | set(removed)
+        for (user_id, post_id) in wanted:
+            results[(user_id, post_id, kind)] = APPLIED if (user_id, post_id) in changed else UNCHANGED
+        for user_id, post_id in changed:
+            invalidate_post(post_id, viewer_id=user_id)
+        deltas = Counter(post_id for _, post_id in created)
+        deltas.subtract(post_id for _, post_id in removed)
+        _adjust_counters(f'{kind}_count', deltas)
+        if kind == 'like':
+            new_likes = created
+
+    for key in toggles:
+        results.setdefault(key, MISSING_POST)
+    if new_likes:
+        _notify_likes(new_likes)
+    return results
+
+
+def _adjust_counters(field, deltas):
+    posts_by_delta = defaultdict(list)
+    for post_id, delta in deltas.items():
+        if delta:
+            posts_by_delta[delta].append(post_id)
+    for delta, post_ids in posts_by_delta.items():
+        BlogPost.objects.filter(pk__in=post_ids).adjust_counter(field, delta)
+
+
+def _existing_pairs(model, wanted):
+    # Locked, so a concurrent delete of one of these rows cannot be counted twice
+    return set(
+        model.objects.select_for_update().filter(user_id__in={user_id for user_id, _ in wanted},
+                             blog_post_id__in={post_id for _, post_id in wanted})
+        .values_list('user_id', 'blog_post_id')
+    ) & set(wanted)
+
+
+def _insert_pairs(model, pairs):
+    """Insert (user_id, post_id) rows and return the pairs actually inserted.
+
+    One INSERT normally; if a concurrent request wrote one of the rows first,
+    the pairs are retried one by one so only the rows written here count (and
+    notify)."""
+    if not pairs:
+        return []
+    try:
+        with transaction.atomic():
+            model.objects.bulk_create([model(user_id=user_id, blog_post_id=post_id) for user_id, post_id in pairs])
+        return pairs
+    except IntegrityError:
+        pass
+    inserted = []
+    for user_id, post_id in pairs:
+        try:
+            with transaction.atomic():
+                model.objects.create(user_id=user_id, blog_post_id=post_id)
+        except IntegrityError:
+            continue
+        inserted.append((user_id, post_id))
+    return inserted
+
+
+def _notify_likes(pairs):
+    notifications.publish_many(notifications.NotificationEvent('like', user_id, post_id, None)
+                               for user_id, post_id in pairs)
+
+
+def queue_toggle(user, post_id, kind, action, key):
+    """Record a toggle with a single INSERT; a repeated key is ignored"""
+    PendingEngagement.objects.bulk_create(
+        [PendingEngagement(user=user, post_id=post_id, kind=kind, action=action, key=key)],
+        ignore_conflicts=True,
+    )
+
+
+def flush_pending(batch_size=500):
+    """Apply up to batch_size queued toggles in one transaction and return how many were consumed.
+
+    Rows are locked with SKIP LOCKED where the database supports it, so several
+    workers can flush side by side. Later toggles for the same (user, post, kind)
+    win; the queue rows are deleted in the same transaction they are applied in."""
+    with transaction.atomic():
+        pending = list(PendingEngagement.objects.select_for_update(skip_locked=True)
+                       .order_by('id')[:batch_size])
+        if not pending:
+            return 0
+        toggles = {}
+        for item in pending:
+            toggles[(item.user_id, item.post_id, item.kind)] = item.action
+        apply_toggles(toggles)
+        PendingEngagement.objects.filter(id__in=[item.id for item in pending]).delete()
+    return len(pending)
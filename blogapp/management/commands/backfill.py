@@ -0,0 +1,70 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import autodiscover_modules
+
+from blogapp.backfills import BackfillRunner, registry
+from blogapp.models import BackfillCheckpoint
+
+
+class Command(BaseCommand):
+    help = ('Run registered online backfills in primary-key chunks, one short transaction per chunk, '
+            'resuming from the last checkpoint')
+
+    def add_arguments(self, parser):
+        parser.add_argument('jobs', nargs='*', help='Jobs to run, in order (see --list)')
+        parser.add_argument('--list', action='store_true', help='List registered jobs and their checkpoints')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per chunk')
+        parser.add_argument('--sleep', type=float, default=0.0, help='Seconds to pause between chunks')
+        parser.add_argument('--max-batches', type=int, help='Stop after this many chunks; rerun to resume')
+        parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint and start from the first row')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would change without writing')
+        parser.add_argument('--report-every', type=float, default=5.0, help='Seconds between progress lines')
+
+    def handle(self, *args, **options):
+        autodiscover_modules('backfills')
+        if options['list'] or not options['jobs']:
+            return self.list_jobs()
+        unknown = [name for name in options['jobs'] if name not in registry]
+        if unknown:
+            raise CommandError(f'Unknown backfill(s): {", ".join(unknown)}. Use --list to see them.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        for name in options['jobs']:
+            job = registry[name]()
+            last_report = time.monotonic()
+
+            def progress(checkpoint, max_pk):
+                nonlocal last_report
+                if time.monotonic() - last_report >= options['report_every'] or options['verbosity'] > 1:
+                    last_report = time.monotonic()
+                    self.stdout.write(self.describe(checkpoint, max_pk))
+
+            runner = BackfillRunner(job, batch_size=options['batch_size'], sleep=options['sleep'],
+                                    dry_run=options['dry_run'], max_batches=options['max_batches'],
+                                    progress=progress)
+            checkpoint = runner.run(restart=options['restart'])
+            state = 'done' if checkpoint.completed_at else f'paused at pk {checkpoint.last_pk}'
+            action = 'would change' if options['dry_run'] else 'changed'
+            self.stdout.write(self.style.SUCCESS(
+                f'{name}: {state}; processed {checkpoint.processed}, {action} {checkpoint.changed}'
+            ))
+
+    def list_jobs(self):
+        checkpoints = {checkpoint.name: checkpoint for checkpoint in BackfillCheckpoint.objects.all()}
+        for name, job_class in sorted(registry.items()):
+            checkpoint = checkpoints.get(name)
+            if checkpoint is None:
+                state = 'not started'
+            elif checkpoint.completed_at:
+                state = f'completed {checkpoint.completed_at:%Y-%m-%d %H:%M}'
+            else:
+                state = f'at pk {checkpoint.last_pk}'
+            self.stdout.write(f'{name:<20} {job_class.model._meta.db_table:<20} {state:<28} {job_class.description}')
+
+    @staticmethod
+    def describe(checkpoint, max_pk):
+        percent = min(100.0, 100.0 * checkpoint.last_pk / max_pk) if max_pk else 100.0
+        return (f'{checkpoint.name}: pk {checkpoint.last_pk}/{max_pk} ({percent:.1f}%), '
+                f'processed {checkpoint.processed}, changed {checkpoint.changed}')
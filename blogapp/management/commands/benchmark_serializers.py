@@ -0,0 +1,107 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from blogapi.rows import RowSerializer
+from blogapp.engagement import viewer_state
+from blogapp.models import BlogPost, Comment
+from blogapp.serializers import BlogPostSerializer, comment_rows
+from promotions.models import Promotion
+from promotions.serializers import PromotionSerializer
+from users.models import Like
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Compare rows/sec of the DRF serializers and the .values() row serializers behind '
+            'the published post and promotion lists. Runs against a throwaway test database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200, help='Posts and promotions to render per pass')
+        parser.add_argument('--comments', type=int, default=3, help='Comments per post, half of them replies')
+        parser.add_argument('--repeat', type=int, default=5, help='Passes per path; the best one is reported')
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.seed(options['rows'], options['comments'])
+            self.run(options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def seed(self, rows, comments):
+        author = User.objects.create_user(username='bench', email='bench@example.com', password='bench',
+                                          bio='Writes benchmarks', photo='profile_pics/bench.jpg')
+        self.viewer = User.objects.create_user(username='viewer', email='viewer@example.com', password='bench')
+        posts = BlogPost.objects.bulk_create(
+            BlogPost(author=author, title=f'Post {i}', slug=f'post-{i}', content='Body text ' * 200,
+                     excerpt='Excerpt', status='published', featured_image='blog_images/cover.jpg')
+            for i in range(rows)
+        )
+        for post in posts:
+            parent = None
+            for i in range(comments):
+                comment = Comment.objects.create(blog_post=post, author=author, content=f'Comment {i}',
+                                                 parent=parent if i % 2 else None, is_approved=True)
+                parent = comment
+        Like.objects.bulk_create(Like(user=self.viewer, blog_post_id=post.id) for post in posts[::2])
+        Promotion.objects.bulk_create(
+            Promotion(author=author, slogan=f'Promotion {i}', slug=f'promotion-{i}', content='Deal ' * 50,
+                      status='published')
+            for i in range(rows)
+        )
+
+    def run(self, repeat):
+        request = Request(APIRequestFactory().get('/', SERVER_NAME='localhost'))
+        request.user = self.viewer
+        context = {'request': request, 'requested_fields': None}
+
+        def posts_drf():
+            posts = list(BlogPost.objects.filter(status='published').feed())
+            state = viewer_state(self.viewer, [post.id for post in posts])
+            return BlogPostSerializer(posts, many=True, context={**context, 'viewer_state': state}).data
+
+        def posts_rows():
+            serializer = RowSerializer(BlogPostSerializer, context)
+            rows = list(BlogPost.objects.filter(status='published').values(*serializer.columns))
+            post_ids = [row['id'] for row in rows]
+            comments = comment_rows(post_ids, context)
+            state = viewer_state(self.viewer, post_ids)
+            return serializer.render(rows, {
+                'comments': lambda row: comments.get(row['id'], []),
+                'is_liked': lambda row: row['id'] in state['liked'],
+                'is_bookmarked': lambda row: row['id'] in state['bookmarked'],
+            })
+
+        def promotions_drf():
+            promotions = Promotion.objects.filter(status='published').select_related('author')
+            return PromotionSerializer(promotions, many=True, context=context).data
+
+        def promotions_rows():
+            serializer = RowSerializer(PromotionSerializer, context)
+            return serializer.render(Promotion.objects.filter(status='published').values(*serializer.columns))
+
+        for label, drf, rows in (('posts', posts_drf, posts_rows), ('promotions', promotions_drf, promotions_rows)):
+            if JSONRenderer().render(drf()) != JSONRenderer().render(rows()):
+                raise CommandError(f'{label}: row serializer output differs from the DRF serializer')
+            drf_rate = self.rate(drf, repeat)
+            rows_rate = self.rate(rows, repeat)
+            self.stdout.write(f'{label:<11} serializer {drf_rate:>10,.0f} rows/s   '
+                              f'row path {rows_rate:>10,.0f} rows/s   x{rows_rate / drf_rate:.1f}')
+
+    @staticmethod
+    def rate(render, repeat):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            count = len(render())
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return count / best
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blogapp.engagement_queue import flush_pending
+
+
+class Command(BaseCommand):
+    help = 'Apply queued like/bookmark toggles in batches (run as a long-lived worker, or with --once)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Toggles applied per transaction')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Drain the queue and exit')
+
+    def handle(self, *args, **options):
+        total = 0
+        try:
+            while True:
+                flushed = flush_pending(options['batch_size'])
+                total += flushed
+                if flushed and options['verbosity'] > 1:
+                    self.stdout.write(f'Applied {flushed} toggles')
+                if flushed:
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Applied {total} toggles'))
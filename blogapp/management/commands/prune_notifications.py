@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from blogapp.backfills import BackfillRunner, NotificationRetentionBackfill
+from blogapp.models import Notification
+from blogapp.notifications import recount_unread
+
+
+class Command(BaseCommand):
+    help = ('Delete read notifications past NOTIFICATIONS["READ_RETENTION"], then trim each user to '
+            'NOTIFICATIONS["MAX_PER_USER"] newest notifications. Deletes in chunks; safe to run from cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per transaction')
+        parser.add_argument('--sleep', type=float, default=0.0, help='Seconds to pause between chunks')
+        parser.add_argument('--max-per-user', type=int, default=settings.NOTIFICATIONS['MAX_PER_USER'],
+                            help='Notifications kept per user; 0 disables the cap')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be deleted without deleting')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        runner = BackfillRunner(NotificationRetentionBackfill(), batch_size=options['batch_size'],
+                                sleep=options['sleep'], dry_run=options['dry_run'])
+        # Every run rescans from the start: rows age past the cutoff anywhere in the table
+        expired = runner.run(restart=True).changed
+        capped = self.enforce_cap(options['max_per_user'], options['batch_size'], options['dry_run'])
+
+        action = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} {expired} expired read notification(s) and {capped} over the per-user cap'
+        ))
+
+    def enforce_cap(self, cap, batch_size, dry_run):
+        if cap <= 0:
+            return 0
+        over = (Notification.objects.values('recipient_id').annotate(total=Count('id'))
+                .filter(total__gt=cap).values_list('recipient_id', flat=True))
+        deleted = 0
+        for recipient_id in list(over):
+            extra = list(Notification.objects.filter(recipient_id=recipient_id)
+                         .order_by('-created_at', '-id').values_list('id', flat=True)[cap:])
+            deleted += len(extra)
+            if dry_run:
+                continue
+            for start in range(0, len(extra), batch_size):
+                Notification.objects.filter(id__in=extra[start:start + batch_size]).delete()
+            # The cap can remove unread notifications too
+            recount_unread([recipient_id])
+        return deleted
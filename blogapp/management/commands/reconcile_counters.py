@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blogapp.backfills import repair_post_counters
+from blogapp.models import BlogPost
+
+
+class Command(BaseCommand):
+    help = 'Find blog post engagement counters that drifted from the Like/Bookmark/Comment tables and fix them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Posts checked per chunk')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        checked = fixed = 0
+        last_pk = 0
+
+        while True:
+            post_ids = list(BlogPost.objects.filter(pk__gt=last_pk).order_by('pk')
+                            .values_list('pk', flat=True)[:batch_size])
+            if not post_ids:
+                break
+            last_pk = post_ids[-1]
+
+            actual = [f'actual_{field}' for field in BlogPost.COUNTER_FIELDS]
+            drifted = []
+            rows = BlogPost.objects.filter(pk__in=post_ids).drifted().values('pk', *BlogPost.COUNTER_FIELDS, *actual)
+            for post in rows:
+                drifted.append(post['pk'])
+                if options['verbosity'] > 1:
+                    diffs = {field: (post[field], post[f'actual_{field}']) for field in BlogPost.COUNTER_FIELDS
+                             if post[field] != post[f'actual_{field}']}
+                    self.stdout.write(f'Post {post["pk"]}: {diffs}')
+
+            checked += len(post_ids)
+            fixed += len(drifted)
+            if drifted and not dry_run:
+                with transaction.atomic():
+                    repair_post_counters(drifted)
+
+        action = 'would fix' if dry_run else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} posts, {action} {fixed}'))
@@ -0,0 +1,47 @@
+from django.db import migrations
+
+FTS_TABLE = 'blogapp_blogpost_fts'
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "title, excerpt, content, status UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, excerpt, content, status) '
+            'SELECT id, title, excerpt, content, status FROM blogapp_blogpost'
+        )
+    elif vendor == 'postgresql':
+        # A generated column keeps itself current on every write
+        schema_editor.execute(
+            "ALTER TABLE blogapp_blogpost ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(excerpt, '')), 'B') || "
+            "setweight(to_tsvector('english', coalesce(content, '')), 'C')) STORED"
+        )
+        schema_editor.execute(
+            'CREATE INDEX blogpost_search_idx ON blogapp_blogpost USING GIN (search_vector)'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS blogpost_search_idx')
+        schema_editor.execute('ALTER TABLE blogapp_blogpost DROP COLUMN IF EXISTS search_vector')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogapp', '0004_comment_path'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+def seed_actor_ids(apps, schema_editor):
+    # Earlier rows only know their latest sender; only unread ones can still be folded into
+    Notification = apps.get_model('blogapp', 'Notification')
+    batch = []
+    for notification in (Notification.objects.filter(is_read=False, sender__isnull=False)
+                         .only('id', 'sender_id').iterator(chunk_size=1000)):
+        notification.actor_ids = [notification.sender_id]
+        batch.append(notification)
+        if len(batch) == 1000:
+            Notification.objects.bulk_update(batch, ['actor_ids'])
+            batch = []
+    Notification.objects.bulk_update(batch, ['actor_ids'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogapp', '0009_notification_unread_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='actor_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(seed_actor_ids, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogapp', '0010_notification_actor_ids'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='comment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notifications', to='blogapp.comment'),
+        ),
+    ]
@@ -2,9 +2,61 @@ from django.db import models
 from django.conf import settings
 from django.utils.text import slugify
 from django.urls import reverse
+from django.utils import timezone
+from django.db.models import Count, F, OuterRef, Prefetch, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from blogapi.counters import CounterFieldsMixin
+from users.models import Like, Bookmark
+
+
+def _count_for_post(model):
+    # Correlated COUNT(*) keyed on the outer post, for use as an annotation
+    counts = (model.objects.filter(blog_post_id=OuterRef('pk'))
+              .order_by().values('blog_post_id').annotate(total=Count('*')).values('total'))
+    return Coalesce(Subquery(counts), 0)
+
+
+class BlogPostQuerySet(models.QuerySet):
+    def feed(self, with_author=True, with_comments=True, with_comment_authors=True):
+        """Load authors and prefetch comments so a page of posts serializes in
+        a fixed number of queries; viewer state comes from engagement.viewer_state"""
+        queryset = self
+        if with_author:
+            queryset = queryset.select_related('author')
+        if with_comments:
+            comments = Comment.objects.all()
+            if with_comment_authors:
+                comments = comments.select_related('author')
+            queryset = queryset.prefetch_related(Prefetch('comments', queryset=comments))
+        return queryset
+    
+    def adjust_counter(self, field, delta):
+        """Atomically add delta to one of the engagement counters, never below zero"""
+        return self.update(**{field: Greatest(F(field) + delta, 0)})
+    
+    def recount(self):
+        """Recompute every engagement counter from the source tables in one UPDATE"""
+        return self.update(**self._actual_counts())
+    
+    def drifted(self):
+        """Posts whose counters disagree with the source tables, annotated with actual_<counter>"""
+        queryset = self.annotate(**{f'actual_{field}': count for field, count in self._actual_counts().items()})
+        drift = Q()
+        for field in BlogPost.COUNTER_FIELDS:
+            drift |= ~Q(**{field: F(f'actual_{field}')})
+        return queryset.filter(drift)
+    
+    @staticmethod
+    def _actual_counts():
+        return {
+            'like_count': _count_for_post(Like),
+            'bookmark_count': _count_for_post(Bookmark),
+            'comment_count': _count_for_post(Comment),
+        }
+
 
 # Create your models here.
-class BlogPost(models.Model):
+class BlogPost(CounterFieldsMixin, models.Model):
     STATUS_CHOICES = (
         ('draft', 'Draft'),
         ('published', 'Published'),
@@ -22,9 +74,20 @@ class BlogPost(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     published_at = models.DateTimeField(blank=True, null=True)
+    # Denormalized engagement counters, kept in step by the like/bookmark/comment views
+    like_count = models.PositiveIntegerField(default=0)
+    bookmark_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    
+    COUNTER_FIELDS = ('like_count', 'bookmark_count', 'comment_count')
+    
+    objects = BlogPostQuerySet.as_manager()
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', '-published_at', '-id'], name='blogpost_feed_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -32,22 +95,13 @@ class BlogPost(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
+        # Keyset pagination of the feed seeks on published_at, so published posts always carry one
+        if self.status == 'published' and not self.published_at:
+            self.published_at = timezone.now()
         super().save(*args, **kwargs)
     
     def get_absolute_url(self):
         return reverse('blog-post-detail', kwargs={'slug': self.slug})
-    
-    @property
-    def like_count(self):
-        return self.likes.count()
-    
-    @property
-    def bookmark_count(self):
-        return self.bookmarked_by.count()
-    
-    @property
-    def comment_count(self):
-        return self.comments.count()
 
 class Comment(models.Model):
     blog_post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='comments')
@@ -57,13 +111,33 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_approved = models.BooleanField(default=False)
+    # Materialized path of zero-padded ids from the thread root down to this comment,
+    # e.g. '0000000012/0000000040/'. Sorting by it yields a depth-first thread order.
+    path = models.CharField(max_length=1024, blank=True, editable=False, db_index=True)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    
+    PATH_SEGMENT_WIDTH = 10
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['blog_post', 'parent', 'is_approved', 'created_at', 'id'], name='comment_thread_idx'),
+        ]
     
     def __str__(self):
         return f'Comment by {self.author.username} on {self.blog_post.title}'
     
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        if adding and self.parent_id:
+            self.depth = self.parent.depth + 1
+        super().save(*args, **kwargs)
+        if adding and not self.path:
+            # The path embeds our own id, so it can only be written once the row exists
+            prefix = self.parent.path if self.parent_id else ''
+            self.path = f'{prefix}{self.id:0{self.PATH_SEGMENT_WIDTH}d}/'
+            Comment.objects.filter(pk=self.pk).update(path=self.path)
+    
     @property
     def is_reply(self):
         return self.parent is not None
@@ -71,6 +145,15 @@ class Comment(models.Model):
     @property
     def replies_count(self):
         return self.replies.count()
+    
+    def descendants(self):
+        """Replies at any depth below this comment, in thread order"""
+        return Comment.objects.filter(blog_post_id=self.blog_post_id, path__startswith=self.path,
+                                      depth__gt=self.depth).order_by('path')
+    
+    def descendant_count(self):
+        """Number of replies at any depth below this comment"""
+        return self.descendants().count()
 
 class Notification(models.Model):
     NOTIFICATION_TYPES = (
@@ -84,13 +167,65 @@ class Notification(models.Model):
     sender = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='sent_notifications', null=True, blank=True)
     notification_type = models.CharField(max_length=20, choices=NOTIFICATION_TYPES)
     blog_post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='notifications', null=True, blank=True)
-    comment = models.ForeignKey(Comment, on_delete=models.CASCADE, related_name='notifications', null=True, blank=True)
+    # Aggregated rows point at their newest comment; deleting it must not drop the other actors' notification
+    comment = models.ForeignKey(Comment, on_delete=models.SET_NULL, related_name='notifications', null=True, blank=True)
     message = models.TextField()
     is_read = models.BooleanField(default=False)
+    # Unread likes/comments on one post within NOTIFICATIONS['AGGREGATION_WINDOW'] share a row;
+    # sender is the latest actor and actor_count how many distinct ones there were (the ids in actor_ids)
+    actor_count = models.PositiveIntegerField(default=1)
+    actor_ids = models.JSONField(default=list, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['recipient', '-created_at', '-id'], name='notification_feed_idx'),
+            models.Index(fields=['recipient', 'notification_type', 'blog_post', 'is_read'], name='notification_group_idx'),
+            models.Index(fields=['recipient', 'is_read', 'created_at'], name='notification_unread_idx'),
+        ]
+    
+    def __str__(self):
+        return f'Notification for {self.recipient.username}: {self.message}'
+
+
+class BackfillCheckpoint(models.Model):
+    """Progress of a resumable backfill job (see blogapp.backfills)"""
+    name = models.CharField(max_length=100, unique=True)
+    last_pk = models.BigIntegerField(default=0)
+    processed = models.BigIntegerField(default=0)
+    changed = models.BigIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+    
+    def __str__(self):
+        return f'{self.name} at pk {self.last_pk}'
+
+class PendingEngagement(models.Model):
+    """A like/bookmark toggle accepted by the API and not yet applied (see engagement_queue)"""
+    KIND_CHOICES = (
+        ('like', 'Like'),
+        ('bookmark', 'Bookmark'),
+    )
+    ACTION_CHOICES = (
+        ('add', 'Add'),
+        ('remove', 'Remove'),
+    )
+    
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='pending_engagements')
+    # Not a foreign key: queuing must not look the post up; the flush drops toggles for missing posts
+    post_id = models.BigIntegerField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    # Client Idempotency-Key, so a retried request is queued once
+    key = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['id']
+        unique_together = ['user', 'key']
     
     def __str__(self):
-        return f'Notification for {self.recipient.username}: {self.message}'
\ No newline at end of file
+        return f'{self.action} {self.kind} on post {self.post_id} by user {self.user_id}'
@@ -0,0 +1,239 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import Counter, namedtuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import Case, Count, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from . import streams
+from .models import BlogPost, Comment, Notification
+
+logger = logging.getLogger(__name__)
+
+# Requests publish a compact event; the dispatcher resolves recipients and
+# messages for a whole batch and writes it with one bulk_create (plus one
+# bulk_update for events folded into existing notifications).
+NotificationEvent = namedtuple('NotificationEvent', ['notification_type', 'sender_id', 'blog_post_id', 'comment_id'])
+
+MESSAGES = {
+    'like': '{actors} liked your post "{title}"',
+    'comment': '{actors} commented on your post "{title}"',
+}
+
+
+def render_message(notification_type, sender, actor_count, title):
+    if actor_count <= 1:
+        actors = sender
+    else:
+        others = actor_count - 1
+        actors = f'{sender} and {others} {"other" if others == 1 else "others"}'
+    return MESSAGES[notification_type].format(actors=actors, title=title)
+
+
+def deliver(events):
+    """Create or fold in the notifications for a batch of events.
+
+    Events for the same recipient, type and post are collapsed into one
+    notification: into the recipient's unread one from within
+    AGGREGATION_WINDOW if there is one (one bulk_update), otherwise a new row
+    (one bulk_create). Returns the notifications written."""
+    config = settings.NOTIFICATIONS
+    posts = {row['id']: row for row in BlogPost.objects.filter(id__in={e.blog_post_id for e in events})
+             .values('id', 'author_id', 'title')}
+    usernames = dict(get_user_model().objects.filter(id__in={e.sender_id for e in events})
+                     .values_list('id', 'username'))
+    comment_ids = {e.comment_id for e in events if e.comment_id}
+    if comment_ids:
+        comment_ids = set(Comment.objects.filter(id__in=comment_ids).values_list('id', flat=True))
+
+    # (recipient, type, post) -> events in publish order
+    groups = {}
+    for event in events:
+        post = posts.get(event.blog_post_id)
+        if post is None or event.sender_id not in usernames:
+            # The post or the sender was deleted before the event was delivered
+            continue
+        groups.setdefault((post['author_id'], event.notification_type, post['id']), []).append(event)
+    if not groups:
+        return []
+
+    existing = {}
+    aggregated_types = set(config['AGGREGATE_TYPES']) & {key[1] for key in groups}
+    if aggregated_types:
+        since = timezone.now() - config['AGGREGATION_WINDOW']
+        candidates = Notification.objects.filter(
+            recipient_id__in={key[0] for key in groups}, notification_type__in=aggregated_types,
+            blog_post_id__in={key[2] for key in groups}, is_read=False, created_at__gte=since,
+        ).order_by('created_at', 'id')
+        for notification in candidates:
+            existing[(notification.recipient_id, notification.notification_type, notification.blog_post_id)] = notification
+
+    created, updated = [], []
+    for key, group in groups.items():
+        recipient_id, notification_type, post_id = key
+        if notification_type in config['AGGREGATE_TYPES']:
+            batches = [group]
+        else:
+            batches = [[event] for event in group]
+        for batch in batches:
+            latest = batch[-1]
+            notification = existing.get(key) if batch is group else None
+            if notification is None:
+                notification = Notification(recipient_id=recipient_id, notification_type=notification_type,
+                                            blog_post_id=post_id)
+                created.append(notification)
+            else:
+                notification.updated_at = timezone.now()
+                updated.append(notification)
+            # Repeat actors (A, B, then A again; unlike and like again) count once
+            actor_ids = list(dict.fromkeys([*notification.actor_ids, *(event.sender_id for event in batch)]))
+            notification.actor_ids = actor_ids
+            notification.actor_count = len(actor_ids)
+            notification.sender_id = latest.sender_id
+            notification.comment_id = latest.comment_id if latest.comment_id in comment_ids else None
+            notification.message = render_message(notification_type, usernames[latest.sender_id],
+                                                  notification.actor_count, posts[post_id]['title'])
+
+    with transaction.atomic():
+        Notification.objects.bulk_create(created)
+        if updated:
+            Notification.objects.bulk_update(updated, ['sender', 'comment', 'actor_count', 'actor_ids', 'message',
+                                                  'updated_at'])
+        # Folded-in events reuse an unread row, so only new rows count towards the badge
+        _add_unread(Counter(notification.recipient_id for notification in created))
+    written = created + updated
+    transaction.on_commit(lambda: streams.publish_notifications(written))
+    return written
+
+
+def _add_unread(counts):
+    if not counts:
+        return
+    delta = Case(*[When(pk=user_id, then=Value(count)) for user_id, count in counts.items()], default=Value(0))
+    get_user_model().objects.filter(pk__in=counts).update(unread_notifications=F('unread_notifications') + delta)
+
+
+def _unread_for_user():
+    # Correlated COUNT(*) of a user's unread notifications, for use in an UPDATE
+    counts = (Notification.objects.filter(recipient_id=OuterRef('pk'), is_read=False)
+              .order_by().values('recipient_id').annotate(total=Count('*')).values('total'))
+    return Coalesce(Subquery(counts), 0)
+
+
+def recount_unread(user_ids):
+    """Recompute the unread counter of the given users (ids or an id subquery) in one UPDATE"""
+    return get_user_model().objects.filter(pk__in=user_ids).update(unread_notifications=_unread_for_user())
+
+
+def mark_read(user, notifications):
+    """Mark the user's unread notifications in a queryset as read and return how many changed.
+
+    One UPDATE on the notifications and one on the counter, in one transaction."""
+    with transaction.atomic():
+        marked = notifications.filter(recipient=user, is_read=False).update(is_read=True, updated_at=timezone.now())
+        if marked:
+            get_user_model().objects.filter(pk=user.pk).update(
+                unread_notifications=Greatest(F('unread_notifications') - marked, 0))
+    return marked
+
+
+class NotificationDispatcher:
+    """Background thread that batches published events into deliver() calls.
+
+    Events are collected for up to FLUSH_INTERVAL seconds or BATCH_SIZE events,
+    whichever comes first. A batch that fails with a database error is retried
+    MAX_RETRIES times with exponential backoff, then logged and dropped.
+    """
+
+    def __init__(self, batch_size=100, flush_interval=0.5, max_retries=3, retry_backoff=0.5):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def submit(self, event):
+        self.start()
+        self.queue.put(event)
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='notification-dispatcher', daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            events = [self.queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(events) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    events.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self.deliver_with_retries(events)
+            finally:
+                for _ in events:
+                    self.queue.task_done()
+
+    def deliver_with_retries(self, events):
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                deliver(events)
+                return
+            except DatabaseError:
+                logger.warning('Notification batch of %d failed (attempt %d/%d)',
+                               len(events), attempt, self.max_retries, exc_info=True)
+                if attempt < self.max_retries:
+                    time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+            finally:
+                # The thread outlives requests, so it has to recycle its own connection
+                close_old_connections()
+        logger.error('Dropped %d notification events after %d attempts', len(events), self.max_retries)
+
+    def flush(self):
+        """Block until every submitted event has been handled"""
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.join()
+
+
+def _make_dispatcher():
+    config = settings.NOTIFICATIONS
+    return NotificationDispatcher(
+        batch_size=config['BATCH_SIZE'],
+        flush_interval=config['FLUSH_INTERVAL'],
+        max_retries=config['MAX_RETRIES'],
+        retry_backoff=config['RETRY_BACKOFF'],
+    )
+
+
+dispatcher = _make_dispatcher()
+atexit.register(dispatcher.flush)
+
+
+def publish_many(events):
+    """Hand events to the dispatcher once the current transaction commits"""
+    events = list(events)
+    if not events:
+        return
+    if settings.NOTIFICATIONS['ASYNC']:
+        transaction.on_commit(lambda: [dispatcher.submit(event) for event in events])
+    else:
+        transaction.on_commit(lambda: deliver(events))
+
+
+def publish(notification_type, sender_id, blog_post_id, comment_id=None):
+    publish_many([NotificationEvent(notification_type, sender_id, blog_post_id, comment_id)])
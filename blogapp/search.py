@@ -0,0 +1,126 @@
+import re
+
+from django.db import connection
+from django.db.models import Case, Q, When
+
+from .models import BlogPost
+
+# Full-text index over post title, excerpt and content.
+#   sqlite:     FTS5 virtual table FTS_TABLE (rowid = post id), kept in step by signals
+#   postgresql: generated tsvector column blogapp_blogpost.search_vector with a GIN index
+# Other backends fall back to icontains scans.
+
+FTS_TABLE = 'blogapp_blogpost_fts'
+MAX_TERMS = 8
+# Relative weight of title, excerpt and content in the ranking
+SQLITE_WEIGHTS = (10.0, 4.0, 1.0)
+
+
+def _terms(query):
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def _sqlite_match(terms):
+    # Every term must appear; each one also matches as a prefix
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _postgres_tsquery(terms):
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+def index_post(post):
+    """Add or refresh one post in the index"""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.id])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, excerpt, content, status) VALUES (%s, %s, %s, %s, %s)',
+            [post.id, post.title, post.excerpt, post.content, post.status],
+        )
+
+
+def remove_post(post_id):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+
+
+def search_ids(query, status='published', offset=0, limit=None):
+    """Post ids matching every term of query, best match first"""
+    terms = _terms(query)
+    if not terms:
+        return []
+    if connection.vendor == 'sqlite':
+        sql = (f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+               + (' AND status = %s' if status else '')
+               + f' ORDER BY bm25({FTS_TABLE}, {", ".join(map(str, SQLITE_WEIGHTS))}, 0) LIMIT %s OFFSET %s')
+        params = [_sqlite_match(terms), *([status] if status else []), -1 if limit is None else limit, offset]
+    elif connection.vendor == 'postgresql':
+        sql = ("SELECT id FROM blogapp_blogpost WHERE search_vector @@ to_tsquery('english', %s)"
+               + (' AND status = %s' if status else '')
+               + " ORDER BY ts_rank_cd(search_vector, to_tsquery('english', %s)) DESC, id DESC"
+               + ' LIMIT %s OFFSET %s')
+        tsquery = _postgres_tsquery(terms)
+        params = [tsquery, *([status] if status else []), tsquery, limit, offset]
+    else:
+        ids = _fallback_queryset(terms, status).values_list('id', flat=True)
+        return list(ids[offset:None if limit is None else offset + limit])
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def count_matches(query, status='published'):
+    terms = _terms(query)
+    if not terms:
+        return 0
+    if connection.vendor == 'sqlite':
+        sql = f'SELECT COUNT(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s' + (' AND status = %s' if status else '')
+        params = [_sqlite_match(terms), *([status] if status else [])]
+    elif connection.vendor == 'postgresql':
+        sql = ("SELECT COUNT(*) FROM blogapp_blogpost WHERE search_vector @@ to_tsquery('english', %s)"
+               + (' AND status = %s' if status else ''))
+        params = [_postgres_tsquery(terms), *([status] if status else [])]
+    else:
+        return _fallback_queryset(terms, status).count()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone()[0]
+
+
+def _fallback_queryset(terms, status):
+    queryset = BlogPost.objects.all()
+    if status:
+        queryset = queryset.filter(status=status)
+    for term in terms:
+        queryset = queryset.filter(Q(title__icontains=term) | Q(excerpt__icontains=term) | Q(content__icontains=term))
+    return queryset.order_by('-published_at', '-id')
+
+
+class SearchResults:
+    """Lazy, sliceable ranked results, so the paginator only ranks and loads one page"""
+
+    def __init__(self, query, queryset, status='published'):
+        self.query = query
+        self.queryset = queryset
+        self.status = status
+
+    def count(self):
+        return count_matches(self.query, self.status)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError('SearchResults only supports slicing')
+        offset = index.start or 0
+        limit = None if index.stop is None else index.stop - offset
+        ids = search_ids(self.query, self.status, offset, limit)
+        if not ids:
+            return []
+        rank = Case(*[When(id=post_id, then=position) for position, post_id in enumerate(ids)])
+        return list(self.queryset.filter(id__in=ids).order_by(rank))
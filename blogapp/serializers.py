@@ -1,26 +1,83 @@
 from rest_framework import serializers
-from .models import BlogPost, Comment, Notification
+from blogapi.fieldsets import SparseFieldsetMixin
+from blogapi.rows import RowSerializer
+from blogapi.sideload import SideloadMixin
+from .models import BlogPost, Comment, Notification, PendingEngagement
+from users.models import Like, Bookmark
 from users.serializers import UserDetailSerializer
+from .threads import group_replies
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(SideloadMixin, serializers.ModelSerializer):
     author = UserDetailSerializer(read_only=True)
     replies = serializers.SerializerMethodField()
-    replies_count = serializers.ReadOnlyField()
+    replies_count = serializers.SerializerMethodField()
+    replies_next = serializers.SerializerMethodField()
     
     class Meta:
         model = Comment
-        fields = ['id', 'author', 'content', 'parent', 'replies', 'replies_count', 
+        fields = ['id', 'author', 'content', 'parent', 'replies', 'replies_count', 'replies_next',
                  'created_at', 'updated_at', 'is_approved']
         read_only_fields = ['created_at', 'updated_at', 'is_approved']
+        sideload = {'author': 'users'}
+    
+    def _children(self, obj):
+        # Use the in-memory reply map when the caller loaded the whole thread
+        children = self.context.get('comment_children')
+        if children is not None and obj.id in children:
+            return children[obj.id]
+        return None
     
     def get_replies(self, obj):
-        if obj.replies.exists():
-            return CommentSerializer(obj.replies.all(), many=True).data
+        replies = self._children(obj)
+        if replies is None:
+            replies = obj.replies.all()
+        if replies:
+            return CommentSerializer(replies, many=True, context=self.context).data
         return []
+    
+    def get_replies_count(self, obj):
+        if hasattr(obj, 'num_replies'):
+            return obj.num_replies
+        replies = self._children(obj)
+        if replies is None:
+            return obj.replies_count
+        return len(replies)
+    
+    def get_replies_next(self, obj):
+        # Continuation token for replies left out of a bounded tree
+        return self.context.get('comment_continuations', {}).get(obj.id)
 
-class BlogPostSerializer(serializers.ModelSerializer):
+def comment_rows(post_ids, context):
+    """Row twin of BlogPostSerializer.get_comments for a page of posts: one
+    .values() query, rendered into {post_id: [comment, ...]} with full reply trees"""
+    serializer = RowSerializer(CommentSerializer, context)
+    rows = list(Comment.objects.filter(blog_post_id__in=post_ids).values('blog_post', *serializer.columns))
+    children = {}
+    for row in rows:
+        if row['parent'] is not None:
+            children.setdefault(row['parent'], []).append(row)
+    
+    rendered = {}
+    def render(row):
+        # A reply appears in its post's flat list and under its parent; build it once
+        if row['id'] not in rendered:
+            rendered[row['id']] = serializer.to_representation(row, methods)
+        return rendered[row['id']]
+    
+    methods = {
+        'replies': lambda row: [render(child) for child in children.get(row['id'], [])],
+        'replies_count': lambda row: len(children.get(row['id'], [])),
+        'replies_next': lambda row: None,
+    }
+    by_post = {}
+    for row in rows:
+        by_post.setdefault(row['blog_post'], []).append(render(row))
+    return by_post
+
+class BlogPostSerializer(SideloadMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     author = UserDetailSerializer(read_only=True)
-    comments = CommentSerializer(many=True, read_only=True)
+    author_name = serializers.ReadOnlyField(source='author.username')
+    comments = serializers.SerializerMethodField()
     like_count = serializers.ReadOnlyField()
     bookmark_count = serializers.ReadOnlyField()
     comment_count = serializers.ReadOnlyField()
@@ -32,19 +89,39 @@ class BlogPostSerializer(serializers.ModelSerializer):
         fields = ['id', 'author', 'title', 'slug', 'content', 'excerpt', 'status',
                  'read_time', 'featured_image', 'created_at', 'updated_at', 
                  'published_at', 'comments', 'like_count', 'bookmark_count', 
-                 'comment_count', 'is_liked', 'is_bookmarked']
+                 'comment_count', 'is_liked', 'is_bookmarked', 'author_name']
         read_only_fields = ['created_at', 'updated_at', 'published_at', 'slug']
+        optional_fields = ['author_name']
+        views = {
+            'summary': ['id', 'title', 'slug', 'excerpt', 'author_name', 'published_at',
+                        'like_count', 'bookmark_count', 'comment_count'],
+        }
+        field_sources = {'comments': [], 'is_liked': [], 'is_bookmarked': []}
+        sideload = {'author': 'users'}
+    
+    def get_comments(self, obj):
+        # A single load of the post's comments (prefetched by feed()) is enough to build every reply tree
+        comments = list(obj.comments.all())
+        context = {**self.context, 'comment_children': group_replies(comments)}
+        return CommentSerializer(comments, many=True, context=context).data
     
     def get_is_liked(self, obj):
+        # Views resolve the viewer's state for a whole page up front (engagement.viewer_state)
+        state = self.context.get('viewer_state')
+        if state is not None:
+            return obj.id in state['liked']
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.likes.filter(user=request.user).exists()
+            return Like.objects.filter(user=request.user, blog_post_id=obj.id).exists()
         return False
     
     def get_is_bookmarked(self, obj):
+        state = self.context.get('viewer_state')
+        if state is not None:
+            return obj.id in state['bookmarked']
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.bookmarked_by.filter(user=request.user).exists()
+            return Bookmark.objects.filter(user=request.user, blog_post_id=obj.id).exists()
         return False
 
 class BlogPostCreateSerializer(serializers.ModelSerializer):
@@ -61,16 +138,21 @@ class BlogPostUpdateSerializer(serializers.ModelSerializer):
         model = BlogPost
         fields = ['title', 'content', 'excerpt', 'status', 'read_time', 'featured_image']
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(SideloadMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     sender = UserDetailSerializer(read_only=True)
     blog_post_title = serializers.ReadOnlyField(source='blog_post.title')
     
     class Meta:
         model = Notification
         fields = ['id', 'sender', 'notification_type', 'blog_post_title', 
-                 'message', 'is_read', 'created_at']
-        read_only_fields = ['created_at']
+                 'message', 'actor_count', 'is_read', 'created_at', 'updated_at']
+        read_only_fields = ['created_at', 'updated_at']
+        views = {
+            'summary': ['id', 'notification_type', 'message', 'actor_count', 'is_read', 'created_at'],
+        }
+        sideload = {'sender': 'users'}
 
-           
-
-       
+class PendingEngagementSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PendingEngagement
+        fields = ['post_id', 'kind', 'action']
@@ -0,0 +1,45 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from users.models import Like, Bookmark
+from users.serializers import UserDetailSerializer
+from . import search
+from .cache import invalidate_post, invalidate_posts
+from .models import BlogPost, Comment
+
+
+@receiver([post_save, post_delete], sender=BlogPost)
+def invalidate_blog_post(sender, instance, **kwargs):
+    invalidate_post(instance.id, slug=instance.slug)
+
+
+@receiver(post_save, sender=BlogPost)
+def index_blog_post(sender, instance, **kwargs):
+    search.index_post(instance)
+
+
+@receiver(post_delete, sender=BlogPost)
+def unindex_blog_post(sender, instance, **kwargs):
+    search.remove_post(instance.id)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def invalidate_commented_post(sender, instance, **kwargs):
+    invalidate_post(instance.blog_post_id)
+
+
+@receiver([post_save, post_delete], sender=Like)
+@receiver([post_save, post_delete], sender=Bookmark)
+def invalidate_engaged_post(sender, instance, **kwargs):
+    invalidate_post(instance.blog_post_id, viewer_id=instance.user_id)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_authored_posts(sender, instance, created, update_fields=None, **kwargs):
+    # Post details embed their author and commenters; saves such as last_login touch nothing shown
+    if created or (update_fields is not None and not set(update_fields) & set(UserDetailSerializer.Meta.fields)):
+        return
+    invalidate_posts(BlogPost.objects.filter(Q(author=instance) | Q(comments__author=instance))
+                     .values_list('id', flat=True).distinct())
@@ -0,0 +1,209 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+
+from .models import Comment, Notification
+from .serializers import CommentSerializer, NotificationSerializer
+
+logger = logging.getLogger(__name__)
+
+# Server-sent events for the ASGI streaming views. Writers (request threads and
+# the notification dispatcher) publish each row once, already encoded, to an
+# in-process broker; every open stream is an asyncio task on the server's event
+# loop holding a bounded queue, so idle connections cost no thread. Event ids
+# are "<updated_at in microseconds>-<id>" cursors: a reconnecting client sends
+# the last one as Last-Event-ID and missed rows are replayed from the database.
+
+StreamEvent = namedtuple('StreamEvent', ['key', 'message'])
+
+# EventSource cannot send an Authorization header, so browsers open the
+# notification stream with ?stream_token=: a signed user id that opens this
+# stream only and expires after STREAMS['TOKEN_TTL'] seconds. It still lands
+# in access logs, but unlike an access token it is worthless shortly after.
+_token_signer = signing.TimestampSigner(salt='blogapp.streams.token')
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def issue_stream_token(user_id):
+    return _token_signer.sign(str(user_id))
+
+
+def stream_token_user_id(token):
+    """The user id a stream token was issued to, or None if it is forged or expired"""
+    try:
+        return int(_token_signer.unsign(token, max_age=settings.STREAMS['TOKEN_TTL']))
+    except (signing.BadSignature, ValueError):
+        return None
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def post_channel(post_id):
+    return f'post:{post_id}'
+
+
+def make_cursor(updated_at, pk):
+    return f'{(updated_at - EPOCH) // timedelta(microseconds=1)}-{pk}'
+
+
+def read_cursor(value):
+    """(updated_at, id) from a Last-Event-ID, or None when absent or malformed"""
+    try:
+        micros, pk = (int(part) for part in (value or '').split('-'))
+    except ValueError:
+        return None
+    return EPOCH + timedelta(microseconds=micros), pk
+
+
+def encode(event_name, instance, data):
+    cursor = make_cursor(instance.updated_at, instance.pk)
+    message = f'id: {cursor}\nevent: {event_name}\ndata: {json.dumps(data, default=str)}\n\n'
+    return StreamEvent((instance.updated_at, instance.pk), message)
+
+
+class Subscription:
+    """One stream's mailbox; only touched from the loop that created it"""
+
+    def __init__(self, channel, loop, size):
+        self.channel = channel
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=size)
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A client this far behind reconnects and catches up from the database
+            self.queue = asyncio.Queue(maxsize=1)
+            self.queue.put_nowait(None)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class Broker:
+    """Thread-safe, single-process fan-out from publishers to open streams"""
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self.lock = threading.Lock()
+        self.channels = {}
+
+    def subscribe(self, channel):
+        subscription = Subscription(channel, asyncio.get_running_loop(), self.queue_size)
+        with self.lock:
+            self.channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscribers = self.channels.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.channels[subscription.channel]
+
+    def publish(self, channel, event):
+        with self.lock:
+            subscribers = list(self.channels.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                # The loop has shut down; its streams are gone
+                self.unsubscribe(subscription)
+
+    def subscriber_count(self, channel):
+        with self.lock:
+            return len(self.channels.get(channel, ()))
+
+
+broker = Broker(queue_size=settings.STREAMS['QUEUE_SIZE'])
+
+
+def notification_events(notifications):
+    context = {'requested_fields': set(NotificationSerializer.Meta.views['summary'])}
+    return [encode('notification', notification, NotificationSerializer(notification, context=context).data)
+            for notification in notifications]
+
+
+def comment_events(comments):
+    # New comments have no replies yet, so nothing is looked up per comment
+    context = {'comment_children': {comment.id: [] for comment in comments}}
+    return [encode('comment', comment, CommentSerializer(comment, context=context).data) for comment in comments]
+
+
+def publish_notifications(notifications):
+    for notification, event in zip(notifications, notification_events(notifications)):
+        broker.publish(user_channel(notification.recipient_id), event)
+
+
+def publish_comments(comment_ids):
+    """Push newly approved comments to the viewers of their posts"""
+    if not comment_ids:
+        return
+    comments = list(Comment.objects.filter(id__in=comment_ids, is_approved=True).select_related('author'))
+    for comment, event in zip(comments, comment_events(comments)):
+        broker.publish(post_channel(comment.blog_post_id), event)
+
+
+def _after(queryset, cursor):
+    updated_at, pk = cursor
+    return (queryset.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=pk))
+            .order_by('updated_at', 'id'))
+
+
+def replay_notifications(user_id, cursor, limit):
+    rows = _after(Notification.objects.filter(recipient_id=user_id, is_read=False), cursor)
+    return list(rows[:limit + 1])
+
+
+def replay_comments(post_id, cursor, limit):
+    rows = _after(Comment.objects.filter(blog_post_id=post_id, is_approved=True).select_related('author'), cursor)
+    return list(rows[:limit + 1])
+
+
+async def event_stream(channel, last_event_id, replay, to_events):
+    """Yield SSE frames: rows missed since last_event_id, then live events and keepalives.
+
+    replay(cursor, limit) loads missed rows and to_events encodes them. When more
+    than REPLAY_LIMIT rows were missed a 'reset' event tells the client to reload
+    over REST instead. The stream ends if the client falls too far behind."""
+    config = settings.STREAMS
+    # Subscribe before replaying so nothing published in between is lost
+    subscription = broker.subscribe(channel)
+    try:
+        yield f'retry: {config["RETRY_MS"]}\n\n'
+        seen = read_cursor(last_event_id)
+        if seen is not None:
+            rows = await sync_to_async(replay)(seen, config['REPLAY_LIMIT'])
+            if len(rows) > config['REPLAY_LIMIT']:
+                yield 'event: reset\ndata: {}\n\n'
+                rows = []
+            for event in await sync_to_async(to_events)(rows):
+                seen = event.key
+                yield event.message
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), timeout=config['KEEPALIVE'])
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if event is None:
+                break
+            if seen is not None and event.key <= seen:
+                continue
+            yield event.message
+    finally:
+        broker.unsubscribe(subscription)
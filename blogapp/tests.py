@@ -1,31 +1,959 @@
-from django.test import TestCase
-from django.contrib.auth.models import User
+import asyncio
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-from .models import Post
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from promotions.cache import promotion_cache
+from promotions.models import Promotion
+from users.models import Like, Bookmark
+from . import streams
+from .admin import CommentAdmin
+from .models import BlogPost, Comment, Notification, PendingEngagement
+from .notifications import NotificationDispatcher, NotificationEvent, deliver
+
+User = get_user_model()
 
 # Create your tests here.
 class BlogTests(TestCase):
 #create a user
     @classmethod
-
-    def setupTestData(cls):
+    def setUpTestData(cls):
         testuser1 = User.objects.create_user(
-            username = 'testuser1', password = 'abc123'
+            username = 'testuser1', email = 'testuser1@example.com', password = 'abc123'
             )
         testuser1.save()
 
 #create a blog post
-        test_post = Post.objects.create(
-            author = 'testuser1', password = 'abc123',
+        test_post = BlogPost.objects.create(
+            author = testuser1, title = 'Blog title', content = 'Body Content',
         )
         test_post.save()
 
     def test_blog_content(self):
-        post = Post.objects.get(id=1)
+        post = BlogPost.objects.get(title='Blog title')
         author = f'{post.author}'
         title = f'{post.title}'
-        body  = f'{post.body}'
+        body  = f'{post.content}'
         self.assertEqual(author, 'testuser1')
         self.assertEqual(title, 'Blog title' )
         self.assertEqual(body, 'Body Content')
-        
\ No newline at end of file
+
+
+class FeedQueryTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='abc123')
+        cls.reader = User.objects.create_user(username='reader', email='reader@example.com', password='abc123')
+
+    def setUp(self):
+        cache.clear()
+
+    def make_post(self, title, comments=2):
+        post = BlogPost.objects.create(author=self.author, title=title, content='Body', status='published')
+        Like.objects.create(user=self.reader, blog_post_id=post.id)
+        parent = None
+        for i in range(comments):
+            parent = Comment.objects.create(blog_post=post, author=self.reader, parent=parent,
+                                            content=f'comment {i}', is_approved=True)
+        BlogPost.objects.filter(pk=post.pk).recount()
+        return post
+
+    def test_published_feed_query_count_is_fixed(self):
+        self.make_post('first')
+        self.client.force_authenticate(self.reader)
+        # the viewer's likes and bookmarks for the ETag, then count, posts, comments,
+        # and one query each for the viewer's likes and bookmarks on the page
+        with self.assertNumQueries(7):
+            self.client.get('/api/posts/published/')
+
+        for i in range(5):
+            self.make_post(f'post {i}', comments=4)
+        with self.assertNumQueries(7):
+            response = self.client.get('/api/posts/published/')
+        self.assertEqual(response.data['count'], 6)
+
+    def test_feed_payload(self):
+        post = self.make_post('payload')
+        Bookmark.objects.create(user=self.reader, blog_post_id=post.id)
+        BlogPost.objects.filter(pk=post.pk).recount()
+        self.client.force_authenticate(self.reader)
+        data = self.client.get(f'/api/posts/{post.slug}/').data
+        self.assertEqual(data['like_count'], 1)
+        self.assertEqual(data['bookmark_count'], 1)
+        self.assertEqual(data['comment_count'], 2)
+        self.assertTrue(data['is_liked'])
+        self.assertTrue(data['is_bookmarked'])
+        root = next(c for c in data['comments'] if c['parent'] is None)
+        self.assertEqual(root['replies_count'], 1)
+        self.assertEqual(root['replies'][0]['content'], 'comment 1')
+
+    def test_state_endpoint_resolves_many_posts_at_once(self):
+        liked = self.make_post('liked')
+        other = self.make_post('other')
+        Like.objects.filter(blog_post_id=other.id).delete()
+        Bookmark.objects.create(user=self.reader, blog_post_id=other.id)
+        self.client.force_authenticate(self.reader)
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/posts/state/?ids={liked.id},{other.id}')
+        self.assertEqual(response.data, {
+            str(liked.id): {'is_liked': True, 'is_bookmarked': False},
+            str(other.id): {'is_liked': False, 'is_bookmarked': True},
+        })
+        self.assertEqual(self.client.get('/api/posts/state/?ids=a').status_code, 400)
+
+
+class CounterTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='abc123')
+        cls.reader = User.objects.create_user(username='reader', email='reader@example.com', password='abc123')
+
+    def setUp(self):
+        self.post = BlogPost.objects.create(author=self.author, title='Counted', content='Body', status='published')
+        self.client.force_authenticate(self.reader)
+
+    def counters(self):
+        return BlogPost.objects.values_list(*BlogPost.COUNTER_FIELDS).get(pk=self.post.pk)
+
+    def test_like_and_bookmark_toggles_update_counters(self):
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.client.post(f'/api/posts/{self.post.id}/bookmark/')
+        self.assertEqual(self.counters(), (1, 1, 0))
+        self.client.delete(f'/api/posts/{self.post.id}/unlike/')
+        self.client.delete(f'/api/posts/{self.post.id}/unbookmark/')
+        self.assertEqual(self.counters(), (0, 0, 0))
+
+    def test_deleting_a_comment_removes_its_replies_from_the_counter(self):
+        response = self.client.post(f'/api/posts/{self.post.id}/comments/', {'content': 'root'})
+        root_id = response.data['id']
+        self.client.post(f'/api/posts/{self.post.id}/comments/', {'content': 'reply', 'parent': root_id})
+        self.assertEqual(self.counters(), (0, 0, 2))
+        self.client.delete(f'/api/comments/{root_id}/delete/')
+        self.assertEqual(self.counters(), (0, 0, 0))
+
+    def test_save_does_not_overwrite_counters(self):
+        stale = BlogPost.objects.get(pk=self.post.pk)
+        BlogPost.objects.filter(pk=self.post.pk).adjust_counter('like_count', 3)
+        stale.title = 'Edited'
+        stale.save()
+        self.assertEqual(self.counters(), (3, 0, 0))
+
+    def test_reconcile_counters_fixes_drift(self):
+        Like.objects.create(user=self.reader, blog_post_id=self.post.id)
+        Comment.objects.create(blog_post=self.post, author=self.reader, content='hi')
+        out = StringIO()
+        call_command('reconcile_counters', '--dry-run', stdout=out)
+        self.assertIn('would fix 1', out.getvalue())
+        self.assertEqual(self.counters(), (0, 0, 0))
+        call_command('reconcile_counters', '--batch-size', '1', stdout=out)
+        self.assertEqual(self.counters(), (1, 0, 1))
+
+
+class KeysetPaginationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='abc123')
+        cls.posts = [
+            BlogPost.objects.create(author=cls.author, title=f'Post {i}', content='Body', status='published')
+            for i in range(25)
+        ]
+
+    def walk(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertNotIn('count', response.data)
+            seen.extend(post['id'] for post in response.data['results'])
+            url = response.data['next']
+        return seen
+
+    def test_cursor_walk_visits_every_post_once_in_feed_order(self):
+        expected = list(BlogPost.objects.order_by('-published_at', '-id').values_list('id', flat=True))
+        self.assertEqual(self.walk('/api/posts/published/?pagination=cursor'), expected)
+
+    def test_previous_link_returns_to_the_prior_page(self):
+        first = self.client.get('/api/posts/published/?pagination=cursor').data
+        second = self.client.get(first['next']).data
+        self.assertEqual(self.client.get(second['previous']).data['results'], first['results'])
+
+    def test_page_numbers_remain_the_default(self):
+        response = self.client.get('/api/posts/published/')
+        self.assertEqual(response.data['count'], 25)
+
+    def test_tampered_cursor_is_rejected(self):
+        response = self.client.get('/api/posts/published/?cursor=bogus')
+        self.assertEqual(response.status_code, 404)
+
+
+class CommentThreadTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='abc123')
+        cls.post = BlogPost.objects.create(author=cls.author, title='Thread', content='Body', status='published')
+
+    def reply(self, parent=None, content='reply'):
+        return Comment.objects.create(blog_post=self.post, author=self.author, parent=parent,
+                                      content=content, is_approved=True)
+
+    def test_paths_follow_the_thread(self):
+        root = self.reply(content='root')
+        child = self.reply(root)
+        grandchild = self.reply(child)
+        self.assertEqual(grandchild.depth, 2)
+        self.assertEqual(grandchild.path, f'{root.id:010d}/{child.id:010d}/{grandchild.id:010d}/')
+        self.assertEqual(root.descendant_count(), 2)
+
+    def build_thread(self):
+        root = self.reply(content='root')
+        parent = root
+        for i in range(30):
+            parent = self.reply(parent if i % 2 else root, content=f'reply {i}')
+        return root
+
+    def test_comment_list_costs_one_query_per_level(self):
+        self.build_thread()
+        with self.assertNumQueries(4):
+            response = self.client.get(f'/api/posts/{self.post.id}/comments/?depth=2&replies=50')
+        top = response.data['results'][0]
+        self.assertEqual(top['content'], 'root')
+        self.assertEqual(top['replies_count'], 15)
+        self.assertIsNone(top['replies_next'])
+        self.assertEqual(top['replies'][0]['replies'][0]['content'], 'reply 1')
+        self.assertEqual(top['replies'][0]['replies'][0]['replies'], [])
+
+    def test_bounded_tree_hands_out_continuations(self):
+        root = self.build_thread()
+        top = self.client.get(f'/api/posts/{self.post.id}/comments/?depth=1&replies=4').data['results'][0]
+        self.assertEqual([r['content'] for r in top['replies']], ['reply 0', 'reply 2', 'reply 4', 'reply 6'])
+        self.assertIsNotNone(top['replies'][0]['replies_next'])
+
+        seen = [r['id'] for r in top['replies']]
+        token = top['replies_next']
+        while token:
+            page = self.client.get(f'/api/comments/{root.id}/replies/', {'cursor': token, 'replies': 4, 'depth': 1}).data
+            seen += [r['id'] for r in page['results']]
+            token = page['next']
+        self.assertEqual(seen, list(root.replies.order_by('id').values_list('id', flat=True)))
+
+    def test_continuation_is_bound_to_its_comment(self):
+        root = self.build_thread()
+        other = self.reply(content='other')
+        top = self.client.get(f'/api/posts/{self.post.id}/comments/?depth=1&replies=4').data['results'][0]
+        response = self.client.get(f'/api/comments/{other.id}/replies/', {'cursor': top['replies_next']})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(f'/api/posts/{self.post.id}/comments/?depth=x')
+        self.assertEqual(response.status_code, 400)
+
+
+class DetailCacheTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='abc123')
+        cls.reader = User.objects.create_user(username='reader', email='reader@example.com', password='abc123')
+
+    def setUp(self):
+        cache.clear()
+        self.post = BlogPost.objects.create(author=self.author, title='Cached', content='Body', status='published')
+        self.url = f'/api/posts/{self.post.slug}/'
+
+    def test_repeat_reads_skip_the_database(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['title'], 'Cached')
+
+    def test_viewer_overlay_is_per_user(self):
+        self.client.force_authenticate(self.reader)
+        self.assertFalse(self.client.get(self.url).data['is_liked'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/posts/{self.post.id}/like/')
+        data = self.client.get(self.url).data
+        self.assertTrue(data['is_liked'])
+        self.assertEqual(data['like_count'], 1)
+
+        self.client.force_authenticate(self.author)
+        data = self.client.get(self.url).data
+        self.assertFalse(data['is_liked'])
+        self.assertEqual(data['like_count'], 1)
+
+    def test_writes_invalidate_the_payload(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(blog_post=self.post, author=self.reader, content='new', is_approved=True)
+        self.assertEqual(len(self.client.get(self.url).data['comments']), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.status = 'draft'
+            self.post.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_admin_approval_and_profile_edits_invalidate_the_payload(self):
+        comment = Comment.objects.create(blog_post=self.post, author=self.reader, content='new')
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            CommentAdmin(Comment, admin.site).approve_comments(None, Comment.objects.filter(pk=comment.pk))
+        self.assertTrue(self.client.get(self.url).data['comments'][0]['is_approved'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.username = 'renamed'
+            self.author.save()
+        self.assertEqual(self.client.get(self.url).data['author']['username'], 'renamed')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reader.bio = 'Now with a bio'
+            self.reader.save()
+        self.assertEqual(self.client.get(self.url).data['comments'][0]['author']['bio'], 'Now with a bio')
+
+
+class ConditionalGetTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='abc123')
+        cls.reader = User.objects.create_user(username='reader', email='reader@example.com', password='abc123')
+
+    def setUp(self):
+        cache.clear()
+        self.post = BlogPost.objects.create(author=self.author, title='Polled', content='Body', status='published')
+        self.client.force_authenticate(self.reader)
+
+    def assertRevalidates(self, url, queries=2):
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        return etag
+
+    def test_unchanged_feed_is_not_modified(self):
+        etag = self.assertRevalidates('/api/posts/published/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/posts/{self.post.id}/like/')
+        response = self.client.get('/api/posts/published/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_feed_etag_covers_author_profiles(self):
+        etag = self.client.get('/api/posts/published/?fields=id,author')['ETag']
+        self.author.bio = 'Now with a bio'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.save()
+        response = self.client.get('/api/posts/published/?fields=id,author', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_feed_etag_covers_replaced_and_approved_comments(self):
+        comment = Comment.objects.create(blog_post=self.post, author=self.author, content='First', is_approved=True)
+        BlogPost.objects.filter(pk=self.post.pk).recount()
+        etag = self.client.get('/api/posts/published/')['ETag']
+        # Same count and same newest post timestamp, different comment
+        with self.captureOnCommitCallbacks(execute=True):
+            comment.delete()
+            Comment.objects.create(blog_post=self.post, author=self.author, content='Second', is_approved=True)
+        response = self.client.get('/api/posts/published/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            CommentAdmin(Comment, admin.site).disapprove_comments(None, Comment.objects.all())
+        self.assertEqual(self.client.get('/api/posts/published/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detail_etag_tracks_viewer_state(self):
+        url = f'/api/posts/{self.post.slug}/'
+        etag = self.assertRevalidates(url, queries=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/posts/{self.post.id}/bookmark/')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_notifications_revalidate_until_read(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.client.force_authenticate(self.author)
+        etag = self.assertRevalidates('/api/notifications/', queries=1)
+        self.client.post('/api/notifications/read-all/')
+        self.assertEqual(self.client.get('/api/notifications/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class SearchTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='abc123')
+
+    def post(self, title, content='Body', status='published', excerpt=''):
+        return BlogPost.objects.create(author=self.author, title=title, content=content,
+                                       excerpt=excerpt, status=status)
+
+    def search(self, q):
+        return [post['title'] for post in self.client.get('/api/posts/search/', {'q': q}).data['results']]
+
+    def test_title_matches_rank_above_content_matches(self):
+        self.post('Gardening notes', content='All about django unchained')
+        self.post('Django performance', content='Indexes')
+        self.post('Draft about django', status='draft')
+        self.assertEqual(self.search('django'), ['Django performance', 'Gardening notes'])
+
+    def test_prefix_and_all_terms_must_match(self):
+        self.post('Scaling databases', content='sharding and replication')
+        self.post('Databases for beginners', content='tables')
+        self.assertEqual(self.search('datab shard'), ['Scaling databases'])
+
+    def test_index_follows_saves_and_deletes(self):
+        post = self.post('Original headline')
+        post.title = 'Rewritten headline'
+        post.save()
+        self.assertEqual(self.search('rewritten'), ['Rewritten headline'])
+        self.assertEqual(self.search('original'), [])
+        post.delete()
+        self.assertEqual(self.search('headline'), [])
+
+    def test_query_is_required(self):
+        self.assertEqual(self.client.get('/api/posts/search/').status_code, 400)
+        self.assertEqual(self.search('"* OR ('), [])
+
+
+class SparseFieldsetTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='abc123')
+        for i in range(3):
+            post = BlogPost.objects.create(author=cls.author, title=f'Post {i}', content='Long body ' * 100,
+                                           excerpt='Short', status='published')
+            Comment.objects.create(blog_post=post, author=cls.author, content='hi', is_approved=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_summary_view_skips_content_comments_and_viewer_state(self):
+        self.client.force_authenticate(self.author)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/posts/published/?view=summary')
+        item = response.data['results'][0]
+        self.assertEqual(set(item), {'id', 'title', 'slug', 'excerpt', 'author_name', 'published_at',
+                                     'like_count', 'bookmark_count', 'comment_count'})
+        self.assertEqual(item['author_name'], 'author')
+        post_query = next(q['sql'] for q in queries if 'FROM "blogapp_blogpost"' in q['sql'] and 'LIMIT' in q['sql'])
+        self.assertNotIn('"content"', post_query)
+        self.assertFalse(any('blogapp_comment' in q['sql'] for q in queries))
+        # Only the ETag validators touch likes; is_liked was not requested
+        self.assertFalse(any('users_like' in q['sql'] and ' IN (' in q['sql'] for q in queries))
+
+    def test_fields_parameter_and_default_payload(self):
+        item = self.client.get('/api/posts/published/?fields=id,title').data['results'][0]
+        self.assertEqual(set(item), {'id', 'title'})
+        item = self.client.get('/api/posts/published/').data['results'][0]
+        self.assertNotIn('author_name', item)
+        self.assertIn('comments', item)
+        self.assertEqual(self.client.get('/api/posts/published/?fields=nope').status_code, 400)
+
+    def test_detail_cuts_fields_from_the_cached_payload(self):
+        slug = BlogPost.objects.first().slug
+        self.client.get(f'/api/posts/{slug}/')
+        data = self.client.get(f'/api/posts/{slug}/?view=summary').data
+        self.assertEqual(data['author_name'], 'author')
+        self.assertNotIn('content', data)
+
+
+class RowSerializationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='abc123',
+                                              photo='profile_pics/author.jpg')
+        cls.viewer = User.objects.create_user(username='viewer', email='viewer@example.com', password='abc123')
+        for i in range(3):
+            post = BlogPost.objects.create(author=cls.author, title=f'Post {i}', content='Body', status='published',
+                                           featured_image='blog_images/cover.jpg' if i else '')
+            root = Comment.objects.create(blog_post=post, author=cls.author, content='root', is_approved=True)
+            reply = Comment.objects.create(blog_post=post, author=cls.viewer, content='reply', parent=root)
+            Comment.objects.create(blog_post=post, author=cls.author, content='nested', parent=reply)
+        Like.objects.create(user=cls.viewer, blog_post_id=post.id)
+        Promotion.objects.create(author=cls.author, slogan='Big sale', content='Now', status='published')
+
+    def test_row_path_renders_the_same_json_as_the_serializers(self):
+        self.client.force_authenticate(self.viewer)
+        for url in ('/api/posts/published/', '/api/posts/published/?view=summary',
+                    '/api/posts/published/?pagination=cursor&fields=id,author,is_liked',
+                    '/api/promotions/', '/api/promotions/?view=summary'):
+            with self.settings(FAST_READ_SERIALIZERS=False):
+                expected = self.client.get(url)
+            promotion_cache.invalidate()
+            actual = self.client.get(url)
+            self.assertEqual(actual.status_code, 200)
+            self.assertEqual(actual.content, expected.content, url)
+
+
+class SideloadTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [User.objects.create_user(username=f'user{i}', email=f'user{i}@example.com', password='abc123')
+                       for i in range(3)]
+        cls.post = BlogPost.objects.create(author=cls.authors[0], title='Thread', content='Body', status='published')
+        for i in range(9):
+            root = Comment.objects.create(blog_post=cls.post, author=cls.authors[i % 3], content=f'c{i}',
+                                          is_approved=True)
+            Comment.objects.create(blog_post=cls.post, author=cls.authors[(i + 1) % 3], content='re', parent=root)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_comments_reference_authors_by_id(self):
+        response = self.client.get(f'/api/posts/{self.post.id}/comments/?include=users')
+        comment = response.data['results'][0]
+        self.assertNotIn('author', comment)
+        self.assertEqual(comment['author_id'], self.authors[0].id)
+        self.assertNotIn('author', comment['replies'][0])
+        self.assertEqual(set(response.data['users']), {user.id for user in self.authors})
+        self.assertEqual(response.data['users'][self.authors[1].id]['username'], 'user1')
+
+    def test_users_are_fetched_in_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/posts/published/?include=users')
+        self.assertEqual(response.data['results'][0]['author_id'], self.authors[0].id)
+        self.assertEqual(response.data['results'][0]['comments'][0]['author_id'], self.authors[0].id)
+        self.assertEqual(len(response.data['users']), 3)
+        user_queries = [q for q in queries if 'FROM "users_user"' in q['sql']]
+        self.assertEqual(len(user_queries), 1)
+        self.assertFalse(any('JOIN "users_user"' in q['sql'] for q in queries))
+
+    def test_default_shape_and_unknown_collection(self):
+        response = self.client.get('/api/posts/published/')
+        self.assertNotIn('users', response.data)
+        self.assertEqual(response.data['results'][0]['author']['username'], 'user0')
+        self.assertEqual(self.client.get('/api/posts/published/?include=tags').status_code, 400)
+
+
+class BackfillTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='abc123')
+        cls.post = BlogPost.objects.create(author=cls.author, title='Post', content='Body', status='published')
+        root = Comment.objects.create(blog_post=cls.post, author=cls.author, content='root')
+        reply = Comment.objects.create(blog_post=cls.post, author=cls.author, content='reply', parent=root)
+        Comment.objects.create(blog_post=cls.post, author=cls.author, content='nested', parent=reply)
+        cls.expected = dict(Comment.objects.values_list('id', 'path'))
+
+    def backfill(self, *args):
+        out = StringIO()
+        call_command('backfill', *args, stdout=out)
+        return out.getvalue()
+
+    def test_chunks_resume_from_the_checkpoint(self):
+        Comment.objects.update(path='', depth=0)
+        self.backfill('comment_paths', '--batch-size', '2', '--max-batches', '1')
+        self.assertEqual(Comment.objects.filter(path='').count(), 1)
+        self.assertIn('at pk', self.backfill('--list'))
+        output = self.backfill('comment_paths', '--batch-size', '2')
+        self.assertIn('done', output)
+        self.assertEqual(dict(Comment.objects.values_list('id', 'path')), self.expected)
+        self.assertEqual(sorted(Comment.objects.values_list('depth', flat=True)), [0, 1, 2])
+
+    def test_dry_run_writes_nothing(self):
+        BlogPost.objects.filter(pk=self.post.pk).update(comment_count=0, like_count=4)
+        output = self.backfill('post_counters', '--dry-run')
+        self.assertIn('would change 1', output)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 4)
+        self.assertIn('post_counters', self.backfill('--list'))
+        self.assertIn('not started', self.backfill('--list'))
+        self.backfill('post_counters')
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (0, 3))
+
+
+class EngagementQueueTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='abc123')
+        cls.reader = User.objects.create_user(username='reader', email='reader@example.com', password='abc123')
+        cls.posts = [BlogPost.objects.create(author=cls.author, title=f'Post {i}', content='Body', status='published')
+                     for i in range(2)]
+
+    def setUp(self):
+        self.client.force_authenticate(self.reader)
+
+    def queue(self, post_id, kind='like', action='add', key=None):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        return self.client.post('/api/engagement/', {'post_id': post_id, 'kind': kind, 'action': action}, **headers)
+
+    def drain(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('process_engagement', '--once', stdout=StringIO())
+
+    def test_toggles_are_acknowledged_then_applied_in_a_batch(self):
+        first, second = self.posts
+        with CaptureQueriesContext(connection) as queries:
+            response = self.queue(first.id)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(len(queries), 1)
+        self.queue(second.id)
+        self.queue(second.id, action='remove')
+        self.queue(first.id, kind='bookmark')
+        self.queue(999999)
+        self.assertFalse(Like.objects.exists())
+
+        self.drain()
+        self.assertEqual(set(Like.objects.values_list('blog_post_id', flat=True)), {first.id})
+        self.assertTrue(Bookmark.objects.filter(user=self.reader, blog_post=first).exists())
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.like_count, first.bookmark_count, second.like_count), (1, 1, 0))
+        self.assertEqual(Notification.objects.filter(notification_type='like').count(), 1)
+        self.assertFalse(PendingEngagement.objects.exists())
+
+    def test_replays_are_idempotent(self):
+        post = self.posts[0]
+        self.queue(post.id, key='tap-1')
+        self.queue(post.id, key='tap-1')
+        self.assertEqual(PendingEngagement.objects.count(), 1)
+        self.drain()
+        self.queue(post.id, key='tap-2')
+        self.drain()
+        post.refresh_from_db()
+        self.assertEqual((Like.objects.count(), post.like_count), (1, 1))
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_likes_written_concurrently_are_not_notified_twice(self):
+        first, second = self.posts
+        self.queue(first.id)
+        self.queue(second.id)
+        # A direct like lands between the batch's existence check and its insert
+        Like.objects.create(user=self.reader, blog_post=first)
+        with mock.patch('blogapp.engagement_queue._existing_pairs', return_value=set()):
+            self.drain()
+        self.assertEqual(Like.objects.count(), 2)
+        self.assertEqual(list(Notification.objects.values_list('blog_post_id', flat=True)), [second.id])
+
+    def test_invalid_toggle(self):
+        self.assertEqual(self.queue(self.posts[0].id, kind='share').status_code, 400)
+
+
+class EngagementBatchTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='abc123')
+        cls.reader = User.objects.create_user(username='reader', email='reader@example.com', password='abc123')
+        cls.posts = [BlogPost.objects.create(author=cls.author, title=f'Post {i}', content='Body', status='published')
+                     for i in range(3)]
+        Like.objects.create(user=cls.reader, blog_post=cls.posts[2])
+        BlogPost.objects.recount()
+
+    def setUp(self):
+        self.client.force_authenticate(self.reader)
+
+    def test_replays_operations_with_a_result_each(self):
+        first, second, third = self.posts
+        operations = [
+            {'post_id': first.id, 'op': 'like'},
+            {'post_id': first.id, 'op': 'bookmark'},
+            {'post_id': second.id, 'op': 'like'},
+            {'post_id': second.id, 'op': 'unlike'},
+            {'post_id': third.id, 'op': 'unlike'},
+            {'post_id': third.id, 'op': 'unbookmark'},
+            {'post_id': 999999, 'op': 'like'},
+            {'post_id': first.id, 'op': 'share'},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/engagement/batch/', {'operations': operations}, format='json')
+        self.assertEqual([result['status'] for result in response.data['results']], [
+            'applied', 'applied', 'superseded', 'unchanged', 'applied', 'unchanged', 'missing_post', 'invalid',
+        ])
+        self.assertEqual(list(Like.objects.values_list('blog_post_id', flat=True)), [first.id])
+        counts = dict(BlogPost.objects.values_list('id', 'like_count'))
+        self.assertEqual(counts, {first.id: 1, second.id: 0, third.id: 0})
+
+    def test_counters_move_by_the_applied_rows_without_a_recount(self):
+        first, second, third = self.posts
+        # Drift is left for reconcile_counters rather than recounted on every batch
+        BlogPost.objects.filter(pk=first.pk).update(like_count=5)
+        operations = [{'post_id': first.id, 'op': 'like'}, {'post_id': second.id, 'op': 'like'},
+                      {'post_id': third.id, 'op': 'unlike'}]
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post('/api/engagement/batch/', {'operations': operations}, format='json')
+        self.assertFalse(any('COUNT(' in q['sql'] for q in queries))
+        counts = dict(BlogPost.objects.values_list('id', 'like_count'))
+        self.assertEqual(counts, {first.id: 6, second.id: 1, third.id: 0})
+
+    def test_post_ids_are_checked_with_one_query(self):
+        operations = [{'post_id': post.id, 'op': 'bookmark'} for post in self.posts] * 50
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/engagement/batch/', {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len([q for q in queries if 'FROM "blogapp_blogpost"' in q['sql']
+                              and q['sql'].startswith('SELECT')]), 1)
+        self.assertEqual(Bookmark.objects.count(), 3)
+
+    def test_rejects_oversized_batches(self):
+        operations = [{'post_id': 1, 'op': 'like'}] * 501
+        response = self.client.post('/api/engagement/batch/', {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class NotificationDispatchTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='abc123')
+        cls.reader = User.objects.create_user(username='reader', email='reader@example.com', password='abc123')
+        cls.post = BlogPost.objects.create(author=cls.author, title='Post', content='Body', status='published')
+
+    def setUp(self):
+        self.client.force_authenticate(self.reader)
+
+    def test_requests_publish_and_delivery_happens_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(f'/api/posts/{self.post.id}/like/')
+            response = self.client.post(f'/api/posts/{self.post.id}/comments/', {'content': 'Nice'})
+        self.assertFalse(Notification.objects.exists())
+        for callback in callbacks:
+            callback()
+        messages = dict(Notification.objects.values_list('notification_type', 'message'))
+        self.assertEqual(messages, {'like': 'reader liked your post "Post"',
+                                    'comment': 'reader commented on your post "Post"'})
+        comment = Notification.objects.get(notification_type='comment')
+        self.assertEqual((comment.recipient, comment.comment_id), (self.author, response.data['id']))
+
+    def test_batch_is_one_insert_and_retried(self):
+        events = [NotificationEvent('like', self.reader.id, self.post.id, None),
+                  NotificationEvent('like', self.reader.id, 999999, None)]
+        with CaptureQueriesContext(connection) as queries:
+            deliver(events)
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('INSERT')]), 1)
+
+        dispatcher = NotificationDispatcher(max_retries=3, retry_backoff=0)
+        with mock.patch('blogapp.notifications.deliver', side_effect=[OperationalError, None]) as patched, \
+                mock.patch('blogapp.notifications.close_old_connections'):
+            dispatcher.deliver_with_retries(events)
+        self.assertEqual(patched.call_count, 2)
+
+
+class NotificationAggregationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='abc123')
+        cls.readers = [User.objects.create_user(username=f'reader{i}', email=f'reader{i}@example.com',
+                                                password='abc123') for i in range(3)]
+        cls.post = BlogPost.objects.create(author=cls.author, title='Post', content='Body', status='published')
+
+    def like(self, reader):
+        return NotificationEvent('like', reader.id, self.post.id, None)
+
+    def test_likes_fold_into_one_unread_notification(self):
+        deliver([self.like(self.readers[0])])
+        with CaptureQueriesContext(connection) as queries:
+            deliver([self.like(self.readers[1]), self.like(self.readers[2])])
+        self.assertFalse([q for q in queries if q['sql'].startswith('INSERT')])
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, 3)
+        self.assertEqual(notification.sender, self.readers[2])
+        self.assertEqual(notification.message, 'reader2 and 2 others liked your post "Post"')
+
+    def test_repeat_actors_count_once(self):
+        first, second = self.readers[:2]
+        deliver([self.like(first)])
+        deliver([self.like(second)])
+        deliver([self.like(first)])
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, 2)
+        self.assertEqual(notification.message, 'reader0 and 1 other liked your post "Post"')
+
+        # Like, unlike and like again in one batch
+        deliver([self.like(second), self.like(second)])
+        self.assertEqual(Notification.objects.get().actor_count, 2)
+
+    def test_deleting_the_latest_comment_keeps_the_other_actors_notification(self):
+        comments = [Comment.objects.create(blog_post=self.post, author=reader, content='hi')
+                    for reader in self.readers[:2]]
+        deliver([NotificationEvent('comment', comment.author_id, self.post.id, comment.id) for comment in comments])
+        client = APIClient()
+        client.force_authenticate(self.readers[1])
+        client.delete(f'/api/comments/{comments[1].id}/delete/')
+        notification = Notification.objects.get()
+        self.assertEqual((notification.actor_count, notification.comment_id), (2, None))
+
+        # A notification about the deleted comment alone goes with it
+        deliver([NotificationEvent('comment', self.readers[0].id, self.post.id, comments[0].id)])
+        Notification.objects.update(is_read=True)
+        comment = Comment.objects.create(blog_post=self.post, author=self.readers[2], content='solo')
+        deliver([NotificationEvent('comment', self.readers[2].id, self.post.id, comment.id)])
+        client.force_authenticate(self.readers[2])
+        client.delete(f'/api/comments/{comment.id}/delete/')
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_read_notifications_are_not_reopened(self):
+        deliver([self.like(self.readers[0])])
+        Notification.objects.update(is_read=True)
+        deliver([self.like(self.readers[1])])
+        self.assertEqual(list(Notification.objects.order_by('id').values_list('is_read', 'actor_count')),
+                         [(True, 1), (False, 1)])
+
+    def test_prune_removes_expired_read_and_enforces_cap(self):
+        deliver([self.like(self.readers[0])])
+        Notification.objects.update(is_read=True, updated_at=timezone.now() - timedelta(days=60))
+        for reader in self.readers:
+            Notification.objects.create(recipient=self.author, sender=reader, notification_type='review',
+                                        message='reviewed your post')
+
+        out = StringIO()
+        call_command('prune_notifications', '--max-per-user', '2', stdout=out)
+        self.assertIn('Deleted 1 expired read notification(s) and 1 over the per-user cap', out.getvalue())
+        self.assertEqual(list(Notification.objects.order_by('id').values_list('sender__username', flat=True)),
+                         ['reader1', 'reader2'])
+
+
+class UnreadNotificationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='abc123')
+        cls.readers = [User.objects.create_user(username=f'reader{i}', email=f'reader{i}@example.com',
+                                                password='abc123') for i in range(3)]
+        cls.posts = [BlogPost.objects.create(author=cls.author, title=f'Post {i}', content='Body', status='published')
+                     for i in range(3)]
+        deliver([NotificationEvent('comment', reader.id, post.id, None)
+                 for reader, post in zip(cls.readers, cls.posts)])
+
+    def unread_count(self):
+        self.client.force_authenticate(User.objects.get(pk=self.author.pk))
+        with self.assertNumQueries(1):
+            return self.client.get('/api/notifications/unread-count/').data['unread_count']
+
+    def test_counter_follows_delivery_and_reads(self):
+        self.assertEqual(self.unread_count(), 3)
+        # Folding into an unread notification does not add to the badge
+        deliver([NotificationEvent('comment', self.readers[1].id, self.posts[0].id, None)])
+        self.assertEqual(self.unread_count(), 3)
+
+        ids = list(Notification.objects.order_by('created_at', 'id').values_list('id', flat=True))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/notifications/read/', {'ids': ids[:1]}, format='json')
+        self.assertEqual(response.data, {'marked': 1})
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('UPDATE')]), 2)
+        self.assertEqual(self.unread_count(), 2)
+
+        response = self.client.post('/api/notifications/read/', {'up_to': ids[1]}, format='json')
+        self.assertEqual(response.data, {'marked': 1})
+        self.assertEqual(list(Notification.objects.filter(is_read=False).values_list('id', flat=True)), ids[2:])
+
+        self.client.post(f'/api/notifications/{ids[2]}/read/')
+        self.client.post(f'/api/notifications/{ids[2]}/read/')
+        self.assertEqual(self.unread_count(), 0)
+
+    def test_mark_read_validates_and_checks_ownership(self):
+        notification = Notification.objects.first()
+        self.client.force_authenticate(self.readers[0])
+        self.assertEqual(self.client.post(f'/api/notifications/{notification.id}/read/').status_code, 404)
+        self.assertEqual(self.client.post('/api/notifications/read/', {'ids': [notification.id]},
+                                          format='json').data, {'marked': 0})
+        self.assertEqual(self.client.post('/api/notifications/read/', {}, format='json').status_code, 400)
+        self.assertEqual(self.client.post('/api/notifications/read/', {'ids': ['x']}, format='json').status_code, 400)
+
+    def test_list_is_eager_loaded(self):
+        self.client.force_authenticate(self.author)
+        # ETag validators, page count, page rows with sender and post joined in
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/notifications/')
+        self.assertEqual(response.data['results'][0]['blog_post_title'], 'Post 2')
+        with self.assertNumQueries(3):
+            self.client.get('/api/notifications/?fields=id,blog_post_title')
+
+    def test_deletes_and_backfill_keep_the_counter_honest(self):
+        self.client.force_authenticate(self.author)
+        self.client.delete(f'/api/posts/{self.posts[0].id}/delete/')
+        self.assertEqual(self.unread_count(), 2)
+
+        User.objects.filter(pk=self.author.pk).update(unread_notifications=9)
+        call_command('backfill', 'unread_notification_counts', stdout=StringIO())
+        self.assertEqual(self.unread_count(), 2)
+
+
+@override_settings(STREAMS={**settings.STREAMS, 'KEEPALIVE': 0.05})
+class StreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='abc123')
+        cls.reader = User.objects.create_user(username='reader', email='reader@example.com', password='abc123')
+        cls.post = BlogPost.objects.create(author=cls.author, title='Post', content='Body', status='published')
+        cls.token = str(RefreshToken.for_user(cls.author).access_token)
+
+    def deliver_and_commit(self, events):
+        with self.captureOnCommitCallbacks(execute=True):
+            return deliver(events)
+
+    async def next_event(self, chunks):
+        while (frame := (await anext(chunks)).decode()) == ': keepalive\n\n':
+            pass
+        return frame
+
+    async def test_notifications_resume_then_go_live(self):
+        deliver_async = sync_to_async(self.deliver_and_commit)
+        [first] = await deliver_async([NotificationEvent('like', self.reader.id, self.post.id, None)])
+        [missed] = await deliver_async([NotificationEvent('comment', self.reader.id, self.post.id, None)])
+        resume_from = streams.make_cursor(first.updated_at, first.id)
+
+        response = await self.async_client.get('/api/notifications/stream/',
+                                               headers={'Authorization': f'Bearer {self.token}',
+                                                        'Last-Event-ID': resume_from})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = response.streaming_content
+        self.assertTrue((await anext(chunks)).startswith(b'retry:'))
+        replayed = (await anext(chunks)).decode()
+        self.assertIn(f'id: {streams.make_cursor(missed.updated_at, missed.id)}\n', replayed)
+        self.assertIn('event: notification', replayed)
+
+        self.assertEqual(await anext(chunks), b': keepalive\n\n')
+        await deliver_async([NotificationEvent('like', self.reader.id, self.post.id, None)])
+        self.assertIn('reader liked your post', await self.next_event(chunks))
+        await chunks.aclose()
+
+    async def test_notification_stream_requires_a_token(self):
+        response = await self.async_client.get('/api/notifications/stream/', {'access_token': self.token})
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get('/api/notifications/stream/', {'stream_token': 'nope'})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_browsers_open_the_stream_with_a_short_lived_token(self):
+        response = await self.async_client.post('/api/notifications/stream/token/',
+                                                headers={'Authorization': f'Bearer {self.token}'})
+        stream_token = response.json()['stream_token']
+        response = await self.async_client.get('/api/notifications/stream/', {'stream_token': stream_token})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        await response.streaming_content.aclose()
+        with override_settings(STREAMS={**settings.STREAMS, 'TOKEN_TTL': -1}):
+            response = await self.async_client.get('/api/notifications/stream/', {'stream_token': stream_token})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_comment_stream_pushes_approved_comments(self):
+        self.assertEqual((await self.async_client.get('/api/posts/999999/comments/stream/')).status_code, 404)
+        response = await self.async_client.get(f'/api/posts/{self.post.id}/comments/stream/')
+        chunks = response.streaming_content
+        await anext(chunks)
+
+        comment = await Comment.objects.acreate(blog_post=self.post, author=self.reader, content='First!',
+                                                is_approved=True)
+        await sync_to_async(streams.publish_comments)([comment.id])
+        frame = await self.next_event(chunks)
+        self.assertIn('event: comment', frame)
+        self.assertEqual(json.loads(frame.split('data: ')[1])['content'], 'First!')
+        await chunks.aclose()
+
+    async def test_slow_subscribers_are_cut_off(self):
+        stream = streams.event_stream('user:0', None, None, None)
+        await anext(stream)
+        self.assertEqual(streams.broker.subscriber_count('user:0'), 1)
+        event = streams.StreamEvent((timezone.now(), 1), 'event: notification\n\n')
+        for _ in range(settings.STREAMS['QUEUE_SIZE'] + 1):
+            await sync_to_async(streams.broker.publish, thread_sensitive=False)('user:0', event)
+        await asyncio.sleep(0)
+        # The backlog is dropped and the stream ends; the client resumes with Last-Event-ID
+        with self.assertRaises(StopAsyncIteration):
+            await anext(stream)
+        self.assertEqual(streams.broker.subscriber_count('user:0'), 0)
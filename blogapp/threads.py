@@ -0,0 +1,97 @@
+from django.conf import settings
+from django.core import signing
+from django.db.models import Count, F, OuterRef, Subquery, Window
+from django.db.models.functions import Coalesce, RowNumber
+from rest_framework.exceptions import NotFound, ValidationError
+
+from .models import Comment
+
+continuation_signer = signing.Signer(salt='blogapp.threads.continuation')
+
+
+def group_replies(comments):
+    """Map each comment id to its direct replies from an already loaded list"""
+    children = {}
+    for comment in comments:
+        children.setdefault(comment.id, [])
+        if comment.parent_id is not None:
+            children.setdefault(comment.parent_id, []).append(comment)
+    return children
+
+
+def with_reply_counts(queryset):
+    """Annotate num_replies, the total number of direct replies of each comment"""
+    counts = (Comment.objects.filter(parent_id=OuterRef('pk'))
+              .order_by().values('parent_id').annotate(total=Count('*')).values('total'))
+    return queryset.annotate(num_replies=Coalesce(Subquery(counts), 0))
+
+
+def thread_limits(request):
+    """Read ?depth= and ?replies= from the request, clamped to the COMMENT_THREADS settings"""
+    limits = settings.COMMENT_THREADS
+    values = []
+    for param, default, maximum in (('depth', limits['DEFAULT_DEPTH'], limits['MAX_DEPTH']),
+                                    ('replies', limits['DEFAULT_REPLIES'], limits['MAX_REPLIES'])):
+        raw = request.query_params.get(param, default)
+        try:
+            value = int(raw)
+        except (TypeError, ValueError):
+            raise ValidationError({param: 'Must be an integer.'})
+        if value < 0:
+            raise ValidationError({param: 'Must not be negative.'})
+        values.append(min(value, maximum))
+    depth, per_node = values
+    return depth, max(per_node, 1)
+
+
+def load_bounded(roots, depth, per_node, with_authors=True):
+    """Load replies under roots, at most per_node per comment and depth levels down.
+
+    Runs one query per level, so the cost is bounded by the limits rather than
+    the thread size. Returns the children map for the serializer and a map of
+    continuation tokens for every comment whose replies were cut off.
+    """
+    children = {root.id: [] for root in roots}
+    continuations = {}
+    level = list(roots)
+    for _ in range(depth):
+        if not level:
+            break
+        rows = with_reply_counts(Comment.objects.filter(parent_id__in=[c.id for c in level]))
+        if with_authors:
+            rows = rows.select_related('author')
+        rows = rows.annotate(
+            rank=Window(RowNumber(), partition_by=[F('parent_id')], order_by=F('id').asc()),
+        ).filter(rank__lte=per_node + 1).order_by('parent_id', 'id')
+        level = []
+        for row in rows:
+            siblings = children[row.parent_id]
+            if len(siblings) == per_node:
+                continuations[row.parent_id] = make_continuation(row.parent_id, siblings[-1].id)
+                continue
+            siblings.append(row)
+            children[row.id] = []
+            level.append(row)
+    # Comments on the deepest loaded level keep their replies behind a token
+    frontier = roots if depth == 0 else level
+    for comment in frontier:
+        if comment.num_replies:
+            continuations[comment.id] = make_continuation(comment.id, 0)
+    return children, continuations
+
+
+def make_continuation(parent_id, after_id):
+    return continuation_signer.sign_object([parent_id, after_id])
+
+
+def read_continuation(token, parent_id):
+    """Return the reply id to resume after, or 0 when starting from the first reply"""
+    if not token:
+        return 0
+    try:
+        token_parent, after_id = continuation_signer.unsign_object(token)
+    except (signing.BadSignature, TypeError, ValueError):
+        raise NotFound('Invalid cursor')
+    if token_parent != parent_id:
+        raise NotFound('Invalid cursor')
+    return after_id
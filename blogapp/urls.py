@@ -5,6 +5,8 @@ urlpatterns = [
     # Blog Posts
     path('posts/published/', views.PublishedBlogPostListView.as_view(), name='published-posts'),
     path('posts/admin/', views.AdminBlogPostListView.as_view(), name='admin-posts'),
+    path('posts/search/', views.BlogPostSearchView.as_view(), name='blog-post-search'),
+    path('posts/state/', views.blog_post_state, name='blog-post-state'),
     path('posts/<slug:slug>/', views.BlogPostDetailView.as_view(), name='blog-post-detail'),
     path('posts/', views.BlogPostCreateView.as_view(), name='blog-post-create'),
     path('posts/<int:pk>/', views.BlogPostUpdateView.as_view(), name='blog-post-update'),
@@ -21,12 +23,22 @@ urlpatterns = [
     path('posts/<int:post_id>/unbookmark/', views.unbookmark_blog_post, name='unbookmark-post'),
     path('posts/<int:post_id>/bookmark-count/', views.bookmark_count, name='bookmark-count'),
     
+    # Queued likes and bookmarks
+    path('engagement/', views.queue_engagement, name='queue-engagement'),
+    path('engagement/batch/', views.engagement_batch, name='engagement-batch'),
+    
     # Comments
     path('posts/<int:post_id>/comments/', views.CommentListView.as_view(), name='comment-list'),
+    path('posts/<int:post_id>/comments/stream/', views.comment_stream, name='comment-stream'),
+    path('comments/<int:pk>/replies/', views.CommentReplyListView.as_view(), name='comment-replies'),
     path('comments/<int:pk>/delete/', views.CommentDeleteView.as_view(), name='comment-delete'),
     
     # Notifications
     path('notifications/', views.NotificationListView.as_view(), name='notification-list'),
+    path('notifications/stream/', views.notification_stream, name='notification-stream'),
+    path('notifications/stream/token/', views.notification_stream_token, name='notification-stream-token'),
+    path('notifications/unread-count/', views.unread_notification_count, name='unread-notification-count'),
+    path('notifications/read/', views.mark_notifications_read, name='mark-notifications-read'),
     path('notifications/<int:notification_id>/read/', views.mark_notification_read, name='mark-notification-read'),
     path('notifications/read-all/', views.mark_all_notifications_read, name='mark-all-notifications-read'),
 ]
\ No newline at end of file
@@ -1,42 +1,176 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.shortcuts import render, get_object_or_404
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
 from rest_framework import generics, status
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
 from django.utils import timezone
+from uuid import uuid4
+from django.db import transaction
+from django.db.models import Count, Max, Q, Subquery
+from users.authentication import StatelessJWTAuthentication
 from users.models import Like, Bookmark
+from blogapi.conditional import ConditionalGetMixin
+from blogapi.fieldsets import SparseFieldsetViewMixin
+from blogapi.rows import RowSerializationMixin
+from blogapi.sideload import SideloadViewMixin
 
 from .models import BlogPost, Comment, Notification
+from . import cache as post_cache
+from . import notifications, streams
+from .engagement import viewer_state
+from .engagement_queue import MISSING_POST, apply_toggles, queue_toggle
+from .search import SearchResults
+from .threads import load_bounded, make_continuation, read_continuation, thread_limits, with_reply_counts
 from .serializers import (
     BlogPostSerializer, BlogPostCreateSerializer, BlogPostUpdateSerializer,
-    CommentSerializer, NotificationSerializer
+    CommentSerializer, NotificationSerializer, PendingEngagementSerializer, comment_rows
 )
 
+MAX_STATE_IDS = 100
+MAX_BATCH_OPERATIONS = 500
+MAX_MARK_READ_IDS = 500
+# Operation names of the offline queue, mapped to (kind, action)
+BATCH_OPERATIONS = {
+    'like': ('like', 'add'),
+    'unlike': ('like', 'remove'),
+    'bookmark': ('bookmark', 'add'),
+    'unbookmark': ('bookmark', 'remove'),
+}
+
 # Blog Post Views
-class PublishedBlogPostListView(generics.ListAPIView):
-    """GET /api/posts/published - List all published blog posts"""
+class BlogPostFeedMixin(SideloadViewMixin, SparseFieldsetViewMixin):
+    """Shared read path for post lists and details: prefetched comments and
+    batched viewer state keep each page at a fixed query count. Sparse
+    fieldsets (?fields= / ?view=summary) skip the columns, relations and
+    lookups the response does not need; ?include=users skips the author joins."""
     serializer_class = BlogPostSerializer
+    feed_status = 'published'
+    
+    def get_queryset(self):
+        queryset = BlogPost.objects.all()
+        if self.feed_status:
+            queryset = queryset.filter(status=self.feed_status)
+        embed_users = not self.is_sideloaded('users')
+        queryset = queryset.feed(
+            with_author=(self.wants_field('author') and embed_users) or self.wants_field('author_name'),
+            with_comments=self.wants_field('comments'),
+            with_comment_authors=embed_users,
+        )
+        return self.trim_queryset(queryset)
+    
+    def get_serializer(self, *args, **kwargs):
+        if args:
+            posts = list(args[0]) if kwargs.get('many') else [args[0]]
+            context = kwargs.setdefault('context', self.get_serializer_context())
+            if self.wants_field('is_liked') or self.wants_field('is_bookmarked'):
+                context['viewer_state'] = viewer_state(self.request.user, [post.id for post in posts])
+            if kwargs.get('many'):
+                args = (posts, *args[1:])
+        return super().get_serializer(*args, **kwargs)
+
+class PublishedBlogPostListView(ConditionalGetMixin, RowSerializationMixin, BlogPostFeedMixin, generics.ListAPIView):
+    """GET /api/posts/published - List all published blog posts"""
+    permission_classes = [AllowAny]
+    keyset_ordering = ('-published_at', '-id')
+    
+    def get_row_methods(self, rows):
+        post_ids = [row['id'] for row in rows]
+        methods = {}
+        if self.wants_field('comments'):
+            comments = comment_rows(post_ids, self.get_serializer_context())
+            methods['comments'] = lambda row: comments.get(row['id'], [])
+        if self.wants_field('is_liked') or self.wants_field('is_bookmarked'):
+            state = viewer_state(self.request.user, post_ids)
+            methods['is_liked'] = lambda row: row['id'] in state['liked']
+            methods['is_bookmarked'] = lambda row: row['id'] in state['bookmarked']
+        return methods
+    
+    def get_validators(self):
+        # One cache read instead of aggregating over every published post and comment
+        feed = post_cache.get_feed_version()
+        parts = [feed['version']]
+        if self.request.user.is_authenticated:
+            # The viewer's own likes and bookmarks change is_liked / is_bookmarked
+            for model in (Like, Bookmark):
+                parts.append(model.objects.filter(user=self.request.user)
+                             .aggregate(total=Count('id'), last=Max('id')))
+        return parts, feed['changed_at']
+
+class BlogPostSearchView(BlogPostFeedMixin, generics.ListAPIView):
+    """GET /api/posts/search/?q= - Ranked full-text search over published posts"""
     permission_classes = [AllowAny]
     
     def get_queryset(self):
-        return BlogPost.objects.filter(status='published').select_related('author')
+        return SearchResults(self.request.query_params.get('q', ''), super().get_queryset())
+    
+    def list(self, request, *args, **kwargs):
+        if not request.query_params.get('q', '').strip():
+            return Response({'error': 'Query parameter q is required'}, status=status.HTTP_400_BAD_REQUEST)
+        return super().list(request, *args, **kwargs)
 
-class AdminBlogPostListView(generics.ListAPIView):
+class AdminBlogPostListView(BlogPostFeedMixin, generics.ListAPIView):
     """GET /api/posts/admin - Admin-only view of all blog posts"""
-    serializer_class = BlogPostSerializer
     permission_classes = [IsAdminUser]
-    
-    def get_queryset(self):
-        return BlogPost.objects.all().select_related('author')
+    feed_status = None
 
-class BlogPostDetailView(generics.RetrieveAPIView):
+class BlogPostDetailView(ConditionalGetMixin, BlogPostFeedMixin, generics.RetrieveAPIView):
     """GET /api/posts/<slug> - Get blog post by slug"""
-    serializer_class = BlogPostSerializer
     permission_classes = [AllowAny]
     lookup_field = 'slug'
+    sideload_query_param = None
     
     def get_queryset(self):
-        return BlogPost.objects.filter(status='published').select_related('author')
+        # The cached payload always carries every field; sparse fieldsets are cut from it per response
+        return BlogPost.objects.filter(status=self.feed_status).feed()
+    
+    def get_cached_entry(self):
+        # The shared payload is cached per post; only the viewer's flags are per user
+        entry = post_cache.get_post_detail(self.kwargs['slug'])
+        if entry is None:
+            context = {**self.get_serializer_context(), 'viewer_state': viewer_state(None, []),
+                       'requested_fields': set(BlogPostSerializer.Meta.fields)}
+            payload = BlogPostSerializer(self.get_object(), context=context).data
+            entry = post_cache.set_post_detail(payload)
+        return entry
+    
+    def get_validators(self):
+        self.entry = self.get_cached_entry()
+        self.overlay = post_cache.get_viewer_overlay(self.request.user, self.entry['data']['id'])
+        return [self.entry['etag'], self.overlay], None
+    
+    def retrieve(self, request, *args, **kwargs):
+        data = {**self.entry['data'], **self.overlay}
+        requested = self.get_requested_fields()
+        if requested is None:
+            requested = set(BlogPostSerializer.Meta.fields) - set(BlogPostSerializer.Meta.optional_fields)
+        return Response({name: value for name, value in data.items() if name in requested})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def blog_post_state(request):
+    """GET /api/posts/state/?ids=1,2,3 - Like and bookmark state of the current user for many posts"""
+    try:
+        post_ids = {int(value) for value in request.query_params.get('ids', '').split(',') if value.strip()}
+    except ValueError:
+        return Response({'error': 'ids must be a comma-separated list of integers'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(post_ids) > MAX_STATE_IDS:
+        return Response({'error': f'At most {MAX_STATE_IDS} ids per request'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    state = viewer_state(request.user, post_ids)
+    return Response({
+        str(post_id): {
+            'is_liked': post_id in state['liked'],
+            'is_bookmarked': post_id in state['bookmarked'],
+        }
+        for post_id in sorted(post_ids)
+    })
 
 class BlogPostCreateView(generics.CreateAPIView):
     """POST /api/posts - Create new blog post"""
@@ -57,6 +191,12 @@ class BlogPostDeleteView(generics.DestroyAPIView):
     
     def get_queryset(self):
         return BlogPost.objects.filter(author=self.request.user)
+    
+    def perform_destroy(self, instance):
+        # The post's notifications go with it, unread ones included
+        with transaction.atomic():
+            instance.delete()
+            notifications.recount_unread([instance.author_id])
 
 class BlogPostStatusUpdateView(generics.UpdateAPIView):
     """PUT /api/posts/<post_id>/status - Update blog post status (admin only)"""
@@ -84,20 +224,16 @@ class BlogPostStatusUpdateView(generics.UpdateAPIView):
 @permission_classes([IsAuthenticated])
 def like_blog_post(request, post_id):
     """POST /api/posts/<post_id>/like - Like a blog post"""
-    blog_post = get_object_or_404(BlogPost, id=post_id)
+    blog_post = get_object_or_404(BlogPost.objects.only('id'), id=post_id)
     user = request.user
     
-    like, created = Like.objects.get_or_create(user=user, blog_post=blog_post)
+    with transaction.atomic():
+        like, created = Like.objects.get_or_create(user=user, blog_post=blog_post)
+        if created:
+            BlogPost.objects.filter(pk=blog_post.pk).adjust_counter('like_count', 1)
     
     if created:
-        # Create notification
-        Notification.objects.create(
-            recipient=blog_post.author,
-            sender=user,
-            notification_type='like',
-            blog_post=blog_post,
-            message=f'{user.username} liked your post "{blog_post.title}"'
-        )
+        notifications.publish('like', user.id, blog_post.id)
         return Response({'message': 'Post liked successfully'}, status=status.HTTP_201_CREATED)
     else:
         return Response({'message': 'Post already liked'}, status=status.HTTP_400_BAD_REQUEST)
@@ -109,18 +245,21 @@ def unlike_blog_post(request, post_id):
     blog_post = get_object_or_404(BlogPost, id=post_id)
     user = request.user
     
-    try:
-        like = Like.objects.get(user=user, blog_post=blog_post)
-        like.delete()
+    # Concurrent deletes race on the row; only the one that actually removed it decrements
+    with transaction.atomic():
+        deleted, _ = Like.objects.filter(user=user, blog_post=blog_post).delete()
+        if deleted:
+            BlogPost.objects.filter(pk=blog_post.pk).adjust_counter('like_count', -deleted)
+    if deleted:
         return Response({'message': 'Post unliked successfully'}, status=status.HTTP_200_OK)
-    except Like.DoesNotExist:
+    else:
         return Response({'message': 'Post not liked'}, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def like_count(request, post_id):
     """GET /api/posts/<post_id>/like-count - Get like count for a blog post"""
-    blog_post = get_object_or_404(BlogPost, id=post_id)
+    blog_post = get_object_or_404(BlogPost.objects.only('like_count'), id=post_id)
     return Response({'like_count': blog_post.like_count})
 
 # Bookmark Views
@@ -131,7 +270,10 @@ def bookmark_blog_post(request, post_id):
     blog_post = get_object_or_404(BlogPost, id=post_id)
     user = request.user
     
-    bookmark, created = Bookmark.objects.get_or_create(user=user, blog_post=blog_post)
+    with transaction.atomic():
+        bookmark, created = Bookmark.objects.get_or_create(user=user, blog_post=blog_post)
+        if created:
+            BlogPost.objects.filter(pk=blog_post.pk).adjust_counter('bookmark_count', 1)
     
     if created:
         return Response({'message': 'Post bookmarked successfully'}, status=status.HTTP_201_CREATED)
@@ -145,44 +287,138 @@ def unbookmark_blog_post(request, post_id):
     blog_post = get_object_or_404(BlogPost, id=post_id)
     user = request.user
     
-    try:
-        bookmark = Bookmark.objects.get(user=user, blog_post=blog_post)
-        bookmark.delete()
+    # Concurrent deletes race on the row; only the one that actually removed it decrements
+    with transaction.atomic():
+        deleted, _ = Bookmark.objects.filter(user=user, blog_post=blog_post).delete()
+        if deleted:
+            BlogPost.objects.filter(pk=blog_post.pk).adjust_counter('bookmark_count', -deleted)
+    if deleted:
         return Response({'message': 'Bookmark removed successfully'}, status=status.HTTP_200_OK)
-    except Bookmark.DoesNotExist:
+    else:
         return Response({'message': 'Post not bookmarked'}, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def bookmark_count(request, post_id):
     """GET /api/posts/<post_id>/bookmark-count - Get bookmark count for a blog post"""
-    blog_post = get_object_or_404(BlogPost, id=post_id)
+    blog_post = get_object_or_404(BlogPost.objects.only('bookmark_count'), id=post_id)
     return Response({'bookmark_count': blog_post.bookmark_count})
 
+# Queued engagement
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def queue_engagement(request):
+    """POST /api/engagement/ - Queue a like/bookmark toggle; the process_engagement worker applies it"""
+    serializer = PendingEngagementSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    key = request.headers.get('Idempotency-Key') or uuid4().hex
+    if len(key) > 64:
+        return Response({'error': 'Idempotency-Key must be at most 64 characters'}, status=status.HTTP_400_BAD_REQUEST)
+    queue_toggle(request.user, key=key, **serializer.validated_data)
+    return Response({'message': 'Engagement queued', 'key': key}, status=status.HTTP_202_ACCEPTED)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def engagement_batch(request):
+    """POST /api/engagement/batch/ - Apply many like/unlike/bookmark/unbookmark operations at once"""
+    operations = request.data.get('operations') if isinstance(request.data, dict) else None
+    if not isinstance(operations, list):
+        return Response({'error': 'operations must be a list'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return Response({'error': f'At most {MAX_BATCH_OPERATIONS} operations per request'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    
+    # Replayed in order: the last operation on a post and kind decides its final state
+    results = []
+    indexes = {}
+    toggles = {}
+    for index, operation in enumerate(operations):
+        operation = operation if isinstance(operation, dict) else {}
+        op = operation.get('op')
+        results.append({'post_id': operation.get('post_id'), 'op': op, 'status': 'invalid'})
+        try:
+            post_id = int(operation.get('post_id'))
+        except (TypeError, ValueError):
+            continue
+        if op not in BATCH_OPERATIONS:
+            continue
+        kind, action = BATCH_OPERATIONS[op]
+        key = (request.user.id, post_id, kind)
+        toggles[key] = action
+        indexes.setdefault(key, []).append(index)
+    
+    with transaction.atomic():
+        outcomes = apply_toggles(toggles) if toggles else {}
+    for key, positions in indexes.items():
+        outcome = outcomes[key]
+        for index in positions:
+            results[index]['status'] = outcome if outcome == MISSING_POST or index == positions[-1] else 'superseded'
+    return Response({'results': results})
+
 # Comment Views
-class CommentListView(generics.ListCreateAPIView):
+class CommentListView(SideloadViewMixin, generics.ListCreateAPIView):
     """GET/POST /api/posts/<post_id>/comments - List and create comments for a blog post"""
     serializer_class = CommentSerializer
     permission_classes = [AllowAny]
+    keyset_ordering = ('created_at', 'id')
     
     def get_queryset(self):
         post_id = self.kwargs['post_id']
-        return Comment.objects.filter(blog_post_id=post_id, parent=None, is_approved=True)
+        queryset = with_reply_counts(Comment.objects.filter(blog_post_id=post_id, parent=None, is_approved=True))
+        if self.is_sideloaded('users'):
+            return queryset
+        return queryset.select_related('author')
+    
+    def get_serializer(self, *args, **kwargs):
+        # Reply trees under the page's top-level comments are cut to ?depth= and ?replies=
+        if kwargs.get('many') and args:
+            roots = list(args[0])
+            depth, per_node = thread_limits(self.request)
+            children, continuations = load_bounded(roots, depth, per_node,
+                                                   with_authors=not self.is_sideloaded('users'))
+            context = kwargs.setdefault('context', self.get_serializer_context())
+            context.update(comment_children=children, comment_continuations=continuations)
+            args = (roots, *args[1:])
+        return super().get_serializer(*args, **kwargs)
     
     def perform_create(self, serializer):
         post_id = self.kwargs['post_id']
-        blog_post = get_object_or_404(BlogPost, id=post_id)
-        serializer.save(author=self.request.user, blog_post=blog_post)
+        blog_post = get_object_or_404(BlogPost.objects.only('id', 'author_id'), id=post_id)
+        with transaction.atomic():
+            serializer.save(author=self.request.user, blog_post=blog_post)
+            BlogPost.objects.filter(pk=blog_post.pk).adjust_counter('comment_count', 1)
         
-        # Create notification for blog post author
-        if self.request.user != blog_post.author:
-            Notification.objects.create(
-                recipient=blog_post.author,
-                sender=self.request.user,
-                notification_type='comment',
-                blog_post=blog_post,
-                message=f'{self.request.user.username} commented on your post "{blog_post.title}"'
-            )
+        # Notify the post author off the request path
+        if self.request.user.id != blog_post.author_id:
+            notifications.publish('comment', self.request.user.id, blog_post.id, serializer.instance.id)
+
+class CommentReplyListView(SideloadViewMixin, generics.GenericAPIView):
+    """GET /api/comments/<comment_id>/replies - Load more replies of a comment from a replies_next token"""
+    serializer_class = CommentSerializer
+    permission_classes = [AllowAny]
+    
+    def get(self, request, pk):
+        parent = get_object_or_404(Comment.objects.only('id', 'parent_id', 'is_approved'), pk=pk)
+        if parent.parent_id is None and not parent.is_approved:
+            raise Http404
+        after_id = read_continuation(request.query_params.get('cursor'), parent.id)
+        depth, per_node = thread_limits(request)
+        
+        embed_users = not self.is_sideloaded('users')
+        replies = with_reply_counts(Comment.objects.filter(parent_id=parent.id, id__gt=after_id))
+        if embed_users:
+            replies = replies.select_related('author')
+        replies = list(replies.order_by('id')[:per_node + 1])
+        next_token = make_continuation(parent.id, replies[per_node - 1].id) if len(replies) > per_node else None
+        replies = replies[:per_node]
+        
+        children, continuations = load_bounded(replies, max(depth - 1, 0), per_node, with_authors=embed_users)
+        context = {**self.get_serializer_context(), 'comment_children': children,
+                   'comment_continuations': continuations}
+        return Response({
+            'next': next_token,
+            'results': CommentSerializer(replies, many=True, context=context).data,
+        })
 
 class CommentDeleteView(generics.DestroyAPIView):
     """DELETE /api/comments/<comment_id> - Delete a comment"""
@@ -191,30 +427,141 @@ class CommentDeleteView(generics.DestroyAPIView):
     
     def get_queryset(self):
         return Comment.objects.filter(author=self.request.user)
+    
+    def perform_destroy(self, instance):
+        # Replies are removed by the cascade, so they come off the counter too
+        with transaction.atomic():
+            # Notifications about these comments alone go with them; aggregated ones keep their other actors
+            comment_ids = [instance.pk, *instance.descendants().values_list('pk', flat=True)]
+            Notification.objects.filter(comment__in=comment_ids, actor_count__lte=1).delete()
+            # Count what this delete removed, not what was there before a concurrent one
+            _, deleted = Comment.objects.filter(pk__in=comment_ids).delete()
+            removed = deleted.get(Comment._meta.label, 0)
+            if removed:
+                BlogPost.objects.filter(pk=instance.blog_post_id).adjust_counter('comment_count', -removed)
+            notifications.recount_unread(BlogPost.objects.filter(pk=instance.blog_post_id).values('author_id'))
 
 # Notification Views
-class NotificationListView(generics.ListAPIView):
+class NotificationListView(ConditionalGetMixin, SideloadViewMixin, SparseFieldsetViewMixin, generics.ListAPIView):
     """GET /api/notifications - List user notifications"""
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
+    keyset_ordering = ('-created_at', '-id')
+    
+    def get_validators(self):
+        # Aggregation folds new actors into existing rows, which bumps updated_at
+        aggregates = self.get_queryset().order_by().aggregate(
+            total=Count('id'), last=Max('id'), unread=Count('id', filter=Q(is_read=False)),
+            changed=Max('updated_at'),
+        )
+        return [sorted(aggregates.items())], None
     
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user)
+        queryset = self.trim_queryset(Notification.objects.filter(recipient=self.request.user))
+        related = []
+        if self.wants_field('sender') and not self.is_sideloaded('users'):
+            related.append('sender')
+        if self.wants_field('blog_post_title'):
+            # Only the title is shown; keep post bodies out of the join
+            related.append('blog_post')
+            queryset = queryset.defer('blog_post__content', 'blog_post__excerpt')
+        return queryset.select_related(*related)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def unread_notification_count(request):
+    """GET /api/notifications/unread-count - Number of unread notifications"""
+    # The request user is built from token claims, so read the live counter rather than a cached row
+    unread = get_user_model().objects.values_list('unread_notifications', flat=True).get(pk=request.user.pk)
+    return Response({'unread_count': unread})
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mark_notification_read(request, notification_id):
     """POST /api/notifications/<notification_id>/read - Mark notification as read"""
-    notification = get_object_or_404(Notification, id=notification_id, recipient=request.user)
-    notification.is_read = True
-    notification.save()
+    marked = notifications.mark_read(request.user, Notification.objects.filter(id=notification_id))
+    if not marked and not Notification.objects.filter(id=notification_id, recipient=request.user).exists():
+        raise Http404
     return Response({'message': 'Notification marked as read'})
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def mark_notifications_read(request):
+    """POST /api/notifications/read - Mark notifications read by {"ids": [...]} or everything up to {"up_to": id}"""
+    data = request.data if isinstance(request.data, dict) else {}
+    ids, up_to = data.get('ids'), data.get('up_to')
+    if (ids is None) == (up_to is None):
+        return Response({'error': 'Send either ids or up_to'}, status=status.HTTP_400_BAD_REQUEST)
+    if ids is not None:
+        if not isinstance(ids, list) or not all(isinstance(pk, int) for pk in ids):
+            return Response({'error': 'ids must be a list of integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > MAX_MARK_READ_IDS:
+            return Response({'error': f'At most {MAX_MARK_READ_IDS} ids per request'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        selected = Notification.objects.filter(id__in=ids)
+    else:
+        if not isinstance(up_to, int):
+            return Response({'error': 'up_to must be a notification id'}, status=status.HTTP_400_BAD_REQUEST)
+        # The notification and everything after it in list order (-created_at, -id)
+        anchor = Subquery(Notification.objects.filter(id=up_to, recipient=request.user).values('created_at'))
+        selected = Notification.objects.filter(Q(created_at__lt=anchor) | Q(created_at=anchor, id__lte=up_to))
+    return Response({'marked': notifications.mark_read(request.user, selected)})
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mark_all_notifications_read(request):
     """POST /api/notifications/read-all - Mark all notifications as read"""
-    Notification.objects.filter(recipient=request.user, is_read=False).update(is_read=True)
+    notifications.mark_read(request.user, Notification.objects.all())
     return Response({'message': 'All notifications marked as read'})
 
+# Event streams (served over ASGI)
+async def _stream_user_id(request):
+    header = request.headers.get('Authorization', '')
+    if not header.startswith('Bearer '):
+        # Browsers' EventSource cannot send headers; see streams.issue_stream_token
+        token = request.GET.get('stream_token')
+        return streams.stream_token_user_id(token) if token else None
+    authentication = StatelessJWTAuthentication()
+    try:
+        # Revocation checks and the user cache may need the database now and then
+        token = await sync_to_async(authentication.get_validated_token)(header[len('Bearer '):])
+        return (await sync_to_async(authentication.get_user)(token)).id
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+def _event_response(stream):
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@require_GET
+async def notification_stream(request):
+    """GET /api/notifications/stream - Server-sent events for the user's new notifications"""
+    user_id = await _stream_user_id(request)
+    if user_id is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+    stream = streams.event_stream(
+        streams.user_channel(user_id), request.headers.get('Last-Event-ID'),
+        lambda cursor, limit: streams.replay_notifications(user_id, cursor, limit), streams.notification_events,
+    )
+    return _event_response(stream)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def notification_stream_token(request):
+    """POST /api/notifications/stream/token - Short-lived token for opening the notification stream"""
+    return Response({'stream_token': streams.issue_stream_token(request.user.id),
+                     'expires_in': settings.STREAMS['TOKEN_TTL']})
 
+@require_GET
+async def comment_stream(request, post_id):
+    """GET /api/posts/<post_id>/comments/stream - Server-sent events for newly approved comments on a post"""
+    if not await BlogPost.objects.filter(id=post_id).aexists():
+        raise Http404
+    stream = streams.event_stream(
+        streams.post_channel(post_id), request.headers.get('Last-Event-ID'),
+        lambda cursor, limit: streams.replay_comments(post_id, cursor, limit), streams.comment_events,
+    )
+    return _event_response(stream)
@@ -3,11 +3,12 @@ from .models import Promotion
 
 @admin.register(Promotion)
 class PromotionAdmin(admin.ModelAdmin):
-    list_display = ('slogan', 'author', 'status', 'created_at')
+    list_display = ('slogan', 'author', 'status', 'weight', 'impressions', 'clicks', 'created_at')
     list_filter = ('status', 'created_at')
     search_fields = ('slogan', 'content', 'author__username')
     prepopulated_fields = {'slug': ('slogan',)}
     ordering = ('-created_at',)
+    readonly_fields = ('impressions', 'clicks')
     
     fieldsets = (
         ('Content', {
@@ -16,4 +17,7 @@ class PromotionAdmin(admin.ModelAdmin):
         ('Metadata', {
             'fields': ('author', 'status')
         }),
+        ('Serving', {
+            'fields': ('weight', 'impressions', 'clicks')
+        }),
     )
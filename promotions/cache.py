@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.db import transaction
+
+from blogapi.tiered_cache import TieredCache
+
+# Rendered promotion list pages and details, keyed by absolute URL. Every
+# promotion write invalidates the lot; promotions change a few times a day.
+
+_config = settings.PROMOTION_CACHE
+promotion_cache = TieredCache(
+    'promotions',
+    alias=_config['ALIAS'],
+    local_max_size=_config['LOCAL_MAX_SIZE'],
+    local_ttl=_config['LOCAL_TTL'],
+    soft_ttl=_config['SOFT_TTL'],
+    hard_ttl=_config['HARD_TTL'],
+)
+
+
+def invalidate_promotions():
+    # Again after commit, so a reader cannot refill the cache from pre-commit rows in between
+    promotion_cache.invalidate()
+    transaction.on_commit(promotion_cache.invalidate)
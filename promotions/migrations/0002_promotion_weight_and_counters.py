@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promotions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='promotion',
+            name='clicks',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='promotion',
+            name='impressions',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='promotion',
+            name='weight',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
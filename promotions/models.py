@@ -2,7 +2,10 @@ from django.db import models
 from django.conf import settings
 from django.utils.text import slugify
 
-class Promotion(models.Model):
+from blogapi.counters import CounterFieldsMixin
+
+
+class Promotion(CounterFieldsMixin, models.Model):
     STATUS_CHOICES = (
         ('draft', 'Draft'),
         ('published', 'Published'),
@@ -14,9 +17,16 @@ class Promotion(models.Model):
     content = models.TextField()
     slug = models.SlugField(max_length=255, unique=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
+    # Relative share of GET /api/promotions/serve/; 0 keeps a published promotion out of rotation
+    weight = models.PositiveIntegerField(default=1)
+    # Flushed in batches by promotions.serving; not kept in step with every request
+    impressions = models.PositiveBigIntegerField(default=0)
+    clicks = models.PositiveBigIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    COUNTER_FIELDS = ('impressions', 'clicks')
+    
     class Meta:
         ordering = ['-created_at']
     
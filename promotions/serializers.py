@@ -1,15 +1,23 @@
 from rest_framework import serializers
 from .models import Promotion
 from users.serializers import UserDetailSerializer
+from blogapi.fieldsets import SparseFieldsetMixin
+from blogapi.sideload import SideloadMixin
 
-class PromotionSerializer(serializers.ModelSerializer):
+class PromotionSerializer(SideloadMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     author = UserDetailSerializer(read_only=True)
+    author_name = serializers.ReadOnlyField(source='author.username')
     
     class Meta:
         model = Promotion
         fields = ['id', 'author', 'slogan', 'content', 'slug', 'status', 
-                 'created_at', 'updated_at']
+                 'created_at', 'updated_at', 'author_name']
         read_only_fields = ['created_at', 'updated_at', 'slug']
+        optional_fields = ['author_name']
+        views = {
+            'summary': ['id', 'slogan', 'slug', 'author_name', 'created_at'],
+        }
+        sideload = {'author': 'users'}
 
 class PromotionCreateSerializer(serializers.ModelSerializer):
     class Meta:
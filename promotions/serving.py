@@ -0,0 +1,143 @@
+import atexit
+import bisect
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from itertools import accumulate
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import Case, F, Value, When
+from rest_framework.renderers import JSONRenderer
+
+from .cache import promotion_cache
+from .models import Promotion
+from .serializers import PromotionSerializer
+
+# GET /api/promotions/serve/ picks from an in-memory table of the published
+# promotions, rebuilt only after the promotion cache generation moves (every
+# promotion write bumps it). Impressions and clicks are counted in memory and
+# written every FLUSH_INTERVAL seconds, one UPDATE per counter, so serving a
+# promotion never touches the database.
+
+logger = logging.getLogger(__name__)
+
+
+class ServingTable:
+    """Rendered promotions with their cumulative weights; pick() is one bisect"""
+
+    def __init__(self, promotions):
+        promotions = [promotion for promotion in promotions if promotion.weight > 0]
+        data = PromotionSerializer(promotions, many=True).data
+        self.payloads = json.loads(JSONRenderer().render(data))
+        self.ids = {payload['id'] for payload in self.payloads}
+        self.cumulative = list(accumulate(promotion.weight for promotion in promotions))
+
+    def pick(self):
+        if not self.cumulative:
+            return None
+        index = bisect.bisect_right(self.cumulative, random.random() * self.cumulative[-1])
+        return self.payloads[index]
+
+
+class PromotionPicker:
+    def __init__(self, check_interval):
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.table = None
+        self.generation = None
+        self.next_check = 0.0
+
+    def expire(self):
+        """Compare generations on the next request instead of waiting for the check interval"""
+        self.next_check = 0.0
+
+    def get_table(self):
+        table = self.table
+        if table is not None and time.monotonic() < self.next_check:
+            return table
+        with self.lock:
+            now = time.monotonic()
+            if self.table is not None and now < self.next_check:
+                return self.table
+            # Read before building, so a write that lands mid-build triggers another rebuild
+            generation = promotion_cache.generation()
+            if self.table is None or generation != self.generation:
+                self.table = ServingTable(Promotion.objects.filter(status='published')
+                                          .select_related('author').order_by('id'))
+                self.generation = generation
+            self.next_check = now + self.check_interval
+            return self.table
+
+    def pick(self):
+        return self.get_table().pick()
+
+    def is_served(self, promotion_id):
+        return promotion_id in self.get_table().ids
+
+
+class EngagementCounter:
+    """Impressions and clicks per promotion, kept in memory until flush().
+
+    A background thread (unless BACKGROUND_FLUSH is off) flushes every
+    FLUSH_INTERVAL seconds, and the counts are flushed at exit. The
+    counts of a flush that fails stay pending for the next one."""
+
+    def __init__(self, flush_interval):
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.pending = {field: Counter() for field in Promotion.COUNTER_FIELDS}
+        self.thread = None
+
+    def record(self, field, promotion_id):
+        with self.lock:
+            self.pending[field][promotion_id] += 1
+        if self.thread is None and settings.PROMOTION_SERVING['BACKGROUND_FLUSH']:
+            self.start()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='promotion-counter', daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Promotion counter flush failed')
+            finally:
+                # The thread outlives requests, so it has to recycle its own connection
+                close_old_connections()
+
+    def flush(self):
+        """Add the pending counts to the database and return how many events were written"""
+        with self.lock:
+            pending, self.pending = self.pending, {field: Counter() for field in Promotion.COUNTER_FIELDS}
+        if not any(pending.values()):
+            return 0
+        try:
+            with transaction.atomic():
+                for field, counts in pending.items():
+                    if counts:
+                        delta = Case(*[When(pk=pk, then=Value(count)) for pk, count in counts.items()],
+                                     default=Value(0))
+                        Promotion.objects.filter(pk__in=counts).update(**{field: F(field) + delta})
+        except DatabaseError:
+            logger.warning('Promotion counter flush failed; keeping the counts for the next one', exc_info=True)
+            with self.lock:
+                for field, counts in pending.items():
+                    self.pending[field].update(counts)
+            return 0
+        return sum(sum(counts.values()) for counts in pending.values())
+
+
+_config = settings.PROMOTION_SERVING
+picker = PromotionPicker(check_interval=_config['CHECK_INTERVAL'])
+counter = EngagementCounter(flush_interval=_config['FLUSH_INTERVAL'])
+atexit.register(counter.flush)
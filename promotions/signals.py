@@ -0,0 +1,14 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import invalidate_promotions
+from .models import Promotion
+from .serving import picker
+
+
+@receiver([post_save, post_delete], sender=Promotion)
+def invalidate_promotion_cache(sender, instance, **kwargs):
+    invalidate_promotions()
+    picker.expire()
+    transaction.on_commit(picker.expire)
@@ -1,3 +1,171 @@
-from django.test import TestCase
+import threading
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APITestCase
+
+from blogapi.tiered_cache import TieredCache
+from .cache import promotion_cache
+from .models import Promotion
+from .serving import counter, picker
+
+User = get_user_model()
 
 # Create your tests here.
+class ConditionalGetTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='abc123')
+
+    def setUp(self):
+        self.promotion = Promotion.objects.create(author=self.author, slogan='Big sale', content='Now', status='published')
+
+    def test_list_answers_not_modified_until_a_promotion_changes(self):
+        etag = self.client.get('/api/promotions/')['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/promotions/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Promotion.objects.create(author=self.author, slogan='Another', content='Now', status='published')
+        self.assertEqual(self.client.get('/api/promotions/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_cached_pages_are_served_without_queries_until_a_write(self):
+        first = self.client.get('/api/promotions/?include=users')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/promotions/?include=users')
+        self.assertEqual(second.content, first.content)
+        self.assertIn('users', second.json())
+
+        self.promotion.slogan = 'Bigger sale'
+        self.promotion.save()
+        item = self.client.get(f'/api/promotions/{self.promotion.slug}/').json()
+        self.assertEqual(item['slogan'], 'Bigger sale')
+        self.promotion.delete()
+        self.assertEqual(self.client.get(f'/api/promotions/{self.promotion.slug}/').status_code, 404)
+
+    def test_cache_key_ignores_param_order_and_skips_unknown_params(self):
+        self.client.get('/api/promotions/?fields=slogan,slug&page=1')
+        with self.assertNumQueries(0):
+            self.client.get('/api/promotions/?page=1&fields=slug,slogan')
+        entries = len(promotion_cache.local)
+        for i in range(3):
+            self.assertEqual(self.client.get(f'/api/promotions/?x={i}').status_code, 200)
+        self.assertEqual(len(promotion_cache.local), entries)
+
+    def test_detail_honours_if_modified_since(self):
+        url = f'/api/promotions/{self.promotion.slug}/'
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+
+class SparseFieldsetTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='abc123')
+        Promotion.objects.create(author=cls.author, slogan='Big sale', content='Now', status='published')
+
+    def test_summary_view(self):
+        item = self.client.get('/api/promotions/?view=summary').data['results'][0]
+        self.assertEqual(set(item), {'id', 'slogan', 'slug', 'author_name', 'created_at'})
+        item = self.client.get('/api/promotions/?fields=slogan').data['results'][0]
+        self.assertEqual(item, {'slogan': 'Big sale'})
+
+
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_misses_build_once(self):
+        tiered = TieredCache('test')
+        builds = []
+
+        def build():
+            builds.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(tiered.get('key', build))) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(results, ['value'] * 20)
+
+    def test_stale_value_is_served_while_another_caller_rebuilds(self):
+        tiered = TieredCache('test', soft_ttl=0)
+        self.assertEqual(tiered.get('key', lambda: 'old'), 'old')
+        lock_key = f'{tiered._shared_key("key")}:lock'
+        cache.add(lock_key, 1)
+        self.assertEqual(tiered.get('key', lambda: 'new'), 'old')
+        cache.delete(lock_key)
+        self.assertEqual(tiered.get('key', lambda: 'new'), 'new')
+
+    def test_invalidate_drops_both_tiers(self):
+        tiered = TieredCache('test')
+        tiered.get('key', lambda: 'old')
+        other_process = TieredCache('test', local_ttl=0)
+        self.assertEqual(other_process.get('key', lambda: 'unused'), 'old')
+        tiered.invalidate()
+        self.assertEqual(tiered.get('key', lambda: 'new'), 'new')
+        self.assertEqual(other_process.get('key', lambda: 'unused'), 'new')
+
+
+class PromotionServingTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='abc123')
+
+    def setUp(self):
+        self.heavy = Promotion.objects.create(author=self.author, slogan='Heavy', content='Now', status='published',
+                                              weight=3)
+        self.light = Promotion.objects.create(author=self.author, slogan='Light', content='Now', status='published')
+        Promotion.objects.create(author=self.author, slogan='Paused', content='Now', status='published', weight=0)
+        Promotion.objects.create(author=self.author, slogan='Draft', content='Now', weight=5)
+        self.addCleanup(counter.flush)
+
+    def serve(self, draw):
+        with mock.patch('promotions.serving.random.random', return_value=draw):
+            return self.client.get('/api/promotions/serve/')
+
+    def test_picks_by_weight_without_queries(self):
+        self.serve(0)
+        with self.assertNumQueries(0):
+            slogans = [self.serve(draw).json()['slogan'] for draw in (0, 0.5, 0.74, 0.76, 0.99)]
+        self.assertEqual(slogans, ['Heavy', 'Heavy', 'Heavy', 'Light', 'Light'])
+
+    def test_table_follows_promotion_writes(self):
+        self.assertEqual(self.serve(0).json()['slogan'], 'Heavy')
+        self.heavy.status = 'archived'
+        self.heavy.save()
+        self.assertEqual(self.serve(0).json()['slogan'], 'Light')
+        Promotion.objects.filter(status='published').delete()
+        self.assertEqual(self.serve(0.5).status_code, 404)
+
+    def test_impressions_and_clicks_are_flushed_in_one_update_each(self):
+        for draw in (0.1, 0.2, 0.9):
+            self.serve(draw)
+        self.assertEqual(self.client.post(f'/api/promotions/{self.heavy.id}/click/').status_code, 204)
+        self.assertEqual(self.client.post(f'/api/promotions/{self.heavy.id + 100}/click/').status_code, 404)
+        self.heavy.refresh_from_db()
+        self.assertEqual(self.heavy.impressions, 0)
+
+        # One UPDATE per counter, inside a savepoint here
+        with self.assertNumQueries(4):
+            self.assertEqual(counter.flush(), 4)
+        self.assertEqual(list(Promotion.objects.filter(weight__gt=0, status='published').order_by('slogan')
+                              .values_list('slogan', 'impressions', 'clicks')),
+                         [('Heavy', 2, 1), ('Light', 1, 0)])
+
+    def test_saving_a_loaded_promotion_keeps_flushed_counts(self):
+        promotion = Promotion.objects.get(pk=self.heavy.pk)
+        self.serve(0)
+        counter.flush()
+        promotion.slogan = 'Heavier'
+        promotion.save()
+        self.assertEqual(Promotion.objects.values_list('slogan', 'impressions').get(pk=self.heavy.pk),
+                         ('Heavier', 1))
@@ -3,8 +3,10 @@ from . import views
 
 urlpatterns = [
     path('promotions/', views.PromotionListView.as_view(), name='promotion-list'),
+    path('promotions/serve/', views.serve_promotion, name='promotion-serve'),
     path('promotions/create/', views.PromotionCreateView.as_view(), name='promotion-create'),
     path('promotions/<slug:slug>/', views.PromotionDetailView.as_view(), name='promotion-detail'),
     path('promotions/<int:pk>/update/', views.PromotionUpdateView.as_view(), name='promotion-update'),
     path('promotions/<int:pk>/delete/', views.PromotionDeleteView.as_view(), name='promotion-delete'),
+    path('promotions/<int:pk>/click/', views.record_promotion_click, name='promotion-click'),
 ] 
\ No newline at end of file
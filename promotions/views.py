@@ -1,33 +1,118 @@
+import json
+from urllib.parse import urlencode
+
+from django.http import Http404
 from django.shortcuts import render
+from django.utils.cache import add_never_cache_headers
 from rest_framework import generics, status
+from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from django.db.models import Max
+from blogapi.conditional import ConditionalGetMixin, make_etag
+from blogapi.fieldsets import SparseFieldsetViewMixin
+from blogapi.rows import RowSerializationMixin
+from blogapi.sideload import SideloadViewMixin
+from .cache import promotion_cache
 from .models import Promotion
+from .serving import counter, picker
 from .serializers import PromotionSerializer, PromotionCreateSerializer
 
 # Create your views here.
 
-class PromotionListView(generics.ListAPIView):
+class CachedPayloadMixin:
+    """Serve GET payloads from promotions.cache, validators included.
+
+    On a miss the view renders as usual (render_payload); the payload is stored
+    as plain JSON data together with its ETag and last-modified time, so a hit
+    costs no query at all. Only requests whose query string is limited to
+    cache_query_params are cached, so arbitrary parameters cannot fill the cache."""
+    cache_query_params = ('fields', 'view')
+    # Comma-separated sets: fields=a,b and fields=b,a render the same payload
+    cache_list_params = ('fields', 'include')
+    
+    def get_cache_key(self):
+        params = self.request.query_params
+        if set(params) - set(self.cache_query_params) or any(len(params.getlist(name)) > 1 for name in params):
+            return None
+        query = []
+        for name in sorted(params):
+            value = params[name]
+            if name in self.cache_list_params:
+                value = ','.join(sorted({part.strip() for part in value.split(',') if part.strip()}))
+            query.append((name, value))
+        # Pagination links are absolute; the host has already been checked against ALLOWED_HOSTS
+        return f'{self.request.get_host()}{self.request.path}?{urlencode(query)}'
+    
+    def get_validators(self):
+        def build():
+            data = json.loads(JSONRenderer().render(self.render_payload().data))
+            return {'data': data, 'etag': make_etag(data), 'last_modified': self.get_last_modified()}
+        key = self.get_cache_key()
+        self.entry = build() if key is None else promotion_cache.get(key, build)
+        # The cached payload already carries its sideloaded users
+        self._sideloads = {}
+        return [self.entry['etag']], self.entry['last_modified']
+    
+    def render_payload(self):
+        raise NotImplementedError
+    
+    def get_last_modified(self):
+        raise NotImplementedError
+
+class PromotionListView(CachedPayloadMixin, ConditionalGetMixin, RowSerializationMixin, SideloadViewMixin, SparseFieldsetViewMixin, generics.ListAPIView):
     """GET /api/promotions - List all published promotions"""
     serializer_class = PromotionSerializer
     permission_classes = [AllowAny]
+    cache_query_params = ('page', 'fields', 'view', 'include')
     
     def get_queryset(self):
-        return Promotion.objects.filter(status='published').select_related('author')
+        queryset = Promotion.objects.filter(status='published')
+        if (self.wants_field('author') and not self.is_sideloaded('users')) or self.wants_field('author_name'):
+            queryset = queryset.select_related('author')
+        return self.trim_queryset(queryset)
+    
+    def render_payload(self):
+        response = super().list(self.request)
+        # Sideloaded users are part of the cached payload
+        response.data.update(self.load_sideloads())
+        return response
+    
+    def get_last_modified(self):
+        return Promotion.objects.filter(status='published').aggregate(last_modified=Max('updated_at'))['last_modified']
+    
+    def list(self, request, *args, **kwargs):
+        return Response(self.entry['data'])
 
 class PromotionCreateView(generics.CreateAPIView):
     """POST /api/promotions - Create new promotion"""
     serializer_class = PromotionCreateSerializer
     permission_classes = [IsAuthenticated]
 
-class PromotionDetailView(generics.RetrieveAPIView):
+class PromotionDetailView(CachedPayloadMixin, ConditionalGetMixin, SparseFieldsetViewMixin, generics.RetrieveAPIView):
     """GET /api/promotions/<slug> - Get promotion by slug"""
     serializer_class = PromotionSerializer
     permission_classes = [AllowAny]
     lookup_field = 'slug'
+    # Every change to a single promotion moves updated_at
+    honor_if_modified_since = True
     
     def get_queryset(self):
-        return Promotion.objects.filter(status='published').select_related('author')
+        queryset = Promotion.objects.filter(status='published')
+        if self.wants_field('author') or self.wants_field('author_name'):
+            queryset = queryset.select_related('author')
+        return self.trim_queryset(queryset)
+    
+    def render_payload(self):
+        self.promotion = self.get_object()
+        return super().retrieve(self.request)
+    
+    def get_last_modified(self):
+        return self.promotion.updated_at
+    
+    def retrieve(self, request, *args, **kwargs):
+        return Response(self.entry['data'])
 
 class PromotionUpdateView(generics.UpdateAPIView):
     """PUT /api/promotions/<promotion_id> - Update promotion"""
@@ -43,3 +128,24 @@ class PromotionDeleteView(generics.DestroyAPIView):
     
     def get_queryset(self):
         return Promotion.objects.filter(author=self.request.user)
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def serve_promotion(request):
+    """GET /api/promotions/serve - One published promotion, picked by weight"""
+    payload = picker.pick()
+    if payload is None:
+        raise Http404
+    counter.record('impressions', payload['id'])
+    response = Response(payload)
+    add_never_cache_headers(response)
+    return response
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def record_promotion_click(request, pk):
+    """POST /api/promotions/<promotion_id>/click - Count a click on a served promotion"""
+    if not picker.is_served(pk):
+        raise Http404
+    counter.record('clicks', pk)
+    return Response(status=status.HTTP_204_NO_CONTENT)
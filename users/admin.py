@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, Bookmark, Like
+from .models import User, Bookmark, Like, TokenRevocation
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
@@ -18,14 +18,23 @@ class CustomUserAdmin(UserAdmin):
 
 @admin.register(Bookmark)
 class BookmarkAdmin(admin.ModelAdmin):
-    list_display = ('user', 'blog_post_id', 'created_at')
+    list_display = ('user', 'blog_post', 'created_at')
+    list_select_related = ('user', 'blog_post')
     list_filter = ('created_at',)
     search_fields = ('user__username',)
     ordering = ('-created_at',)
 
 @admin.register(Like)
 class LikeAdmin(admin.ModelAdmin):
-    list_display = ('user', 'blog_post_id', 'created_at')
+    list_display = ('user', 'blog_post', 'created_at')
+    list_select_related = ('user', 'blog_post')
     list_filter = ('created_at',)
     search_fields = ('user__username',)
     ordering = ('-created_at',)
+
+@admin.register(TokenRevocation)
+class TokenRevocationAdmin(admin.ModelAdmin):
+    list_display = ('user', 'jti', 'issued_before', 'expires_at', 'created_at')
+    list_select_related = ('user',)
+    search_fields = ('jti', 'user__username')
+    ordering = ('-created_at',)
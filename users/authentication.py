@@ -0,0 +1,82 @@
+import copy
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from blogapi.lrucache import TTLCache
+from .revocation import revocations
+
+# Stateless authentication: access tokens carry the fields permission checks read
+# (see CustomTokenObtainPairSerializer.get_token), so a request's user is built
+# from the token alone. Any other field is filled on first access from a
+# per-process cache of full user rows, loaded at most once per USER_CACHE['TTL'].
+
+User = get_user_model()
+
+# Token claims copied onto the request user; everything else is deferred
+CLAIM_FIELDS = ('role', 'is_staff', 'is_superuser')
+
+user_cache = TTLCache(max_size=settings.USER_CACHE['MAX_SIZE'], ttl=settings.USER_CACHE['TTL'])
+
+
+def add_claims(token, user):
+    for field in CLAIM_FIELDS:
+        token[field] = getattr(user, field)
+    return token
+
+
+def get_cached_user(user_id):
+    """A private copy of the user's full row from the per-process cache, or None"""
+    user = user_cache.get_or_load(user_id, lambda: User.objects.filter(pk=user_id).first())
+    return copy.copy(user) if user is not None else None
+
+
+def user_from_claims(user_id, token):
+    """A User whose claim fields are set and whose other fields load lazily from the user cache"""
+    known = {'id': user_id, 'is_active': True, **{field: token[field] for field in CLAIM_FIELDS}}
+    # from_db takes values in model field order
+    names = [field.attname for field in User._meta.concrete_fields if field.attname in known]
+    user = User.from_db(DEFAULT_DB_ALIAS, names, [known[name] for name in names])
+    user._from_claims = True
+    return user
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication without the per-request user query.
+
+    Revoked tokens are rejected (users.revocation). Tokens issued before claims
+    were added fall back to the user cache. A deactivated or deleted user keeps
+    access until their token expires unless their tokens are revoked."""
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if revocations.is_revoked(token):
+            raise InvalidToken(_('Token has been revoked'))
+        return token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        if all(field in validated_token for field in CLAIM_FIELDS):
+            return user_from_claims(user_id, validated_token)
+
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
+
+
+@receiver([post_save, post_delete], sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    user_cache.delete(instance.pk)
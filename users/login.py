@@ -0,0 +1,79 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, get_hasher, identify_hasher, make_password
+
+from .authentication import user_cache
+
+# Password hashing for the async login view. PBKDF2 is deliberately slow, so it
+# runs on a small thread pool (hashlib releases the GIL while hashing) instead
+# of the event loop, and at most WORKERS + QUEUE_SIZE checks may be in flight:
+# past that, logins are refused at once rather than queueing behind the pool.
+
+User = get_user_model()
+
+
+class HasherBusy(Exception):
+    """Every hashing slot is taken; the caller should answer 503"""
+
+
+class PasswordHasherPool:
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.limit = workers + queue_size
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hasher')
+
+    def submit(self, fn, *args):
+        with self.lock:
+            if self.pending >= self.limit:
+                raise HasherBusy()
+            self.pending += 1
+        future = self.executor.submit(fn, *args)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        with self.lock:
+            self.pending -= 1
+
+    async def run(self, fn, *args):
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+
+def verify_password(password, encoded):
+    """(valid, new_encoded): new_encoded is set when the hash should be upgraded.
+
+    encoded is None for unknown users; a hash is still computed so response
+    times do not reveal which emails are registered."""
+    if encoded is None:
+        make_password(password)
+        return False, None
+    if not check_password(password, encoded):
+        return False, None
+    preferred = get_hasher()
+    if identify_hasher(encoded).algorithm != preferred.algorithm or preferred.must_update(encoded):
+        return True, make_password(password, hasher=preferred)
+    return True, None
+
+
+async def authenticate(email, password):
+    """The active user with these credentials, or None. Raises HasherBusy when saturated."""
+    user = await User.objects.filter(email=email).afirst()
+    valid, upgraded = await hasher_pool.run(verify_password, password, user.password if user else None)
+    if user is None or not valid or not user.is_active:
+        return None
+    if upgraded:
+        # Transparent rehash after PASSWORD_HASHERS or its iteration count changes
+        user.password = upgraded
+        await User.objects.filter(pk=user.pk).aupdate(password=upgraded)
+        user_cache.delete(user.pk)
+    return user
+
+
+hasher_pool = PasswordHasherPool(workers=settings.LOGIN_HASHING['WORKERS'],
+                                 queue_size=settings.LOGIN_HASHING['QUEUE_SIZE'])
@@ -0,0 +1,81 @@
+import asyncio
+import os
+import time
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, override_settings
+
+from users import login
+from users.serializers import CustomTokenObtainPairSerializer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Measure logins/sec of the old inline password check and of the async login view under '
+            'concurrent load, per core. Runs against a throwaway test database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='Distinct accounts to log in as')
+        parser.add_argument('--logins', type=int, default=40, help='Logins per measurement')
+        parser.add_argument('--concurrency', type=int, default=16, help='Logins in flight on the async path')
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            emails = self.seed(options['users'])
+            self.run(emails, options['logins'], options['concurrency'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def seed(self, users):
+        self.password = 'bench-password'
+        for i in range(users):
+            User.objects.create_user(username=f'bench{i}', email=f'bench{i}@example.com', password=self.password)
+        return [f'bench{i}@example.com' for i in range(users)]
+
+    def run(self, emails, logins, concurrency):
+        cores = os.cpu_count() or 1
+
+        def inline():
+            for i in range(logins):
+                serializer = CustomTokenObtainPairSerializer(data={'email': emails[i % len(emails)],
+                                                                   'password': self.password})
+                serializer.is_valid(raise_exception=True)
+
+        async def concurrent():
+            client = AsyncClient()
+            statuses = []
+            gate = asyncio.Semaphore(concurrency)
+
+            async def one(email):
+                async with gate:
+                    response = await client.post('/api/auth/login/', {'email': email, 'password': self.password},
+                                                 content_type='application/json')
+                    statuses.append(response.status_code)
+
+            await asyncio.gather(*(one(emails[i % len(emails)]) for i in range(logins)))
+            return statuses
+
+        start = time.perf_counter()
+        inline()
+        inline_rate = logins / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            statuses = async_to_sync(concurrent)()
+        async_rate = statuses.count(200) / (time.perf_counter() - start)
+        refused = statuses.count(503)
+        if refused + statuses.count(200) != len(statuses):
+            raise CommandError(f'Unexpected login responses: {sorted(set(statuses) - {200, 503})}')
+
+        self.stdout.write(f'cores {cores}, hashing workers {login.hasher_pool.workers}, '
+                          f'queue {settings.LOGIN_HASHING["QUEUE_SIZE"]}, concurrency {concurrency}')
+        self.stdout.write(f'inline check   {inline_rate:>8.1f} logins/s   {inline_rate / cores:>8.1f} per core')
+        self.stdout.write(f'async view     {async_rate:>8.1f} logins/s   {async_rate / cores:>8.1f} per core   '
+                          f'{refused} refused with 503')
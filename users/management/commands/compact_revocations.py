@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users.revocation import compact
+
+
+class Command(BaseCommand):
+    help = ('Delete token revocations whose tokens have all expired. Run it periodically; '
+            'each process drops them from its filter at its next rebuild.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per statement')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        deleted = compact(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired revocation(s)'))
@@ -0,0 +1,89 @@
+import django.db.models.deletion
+from django.db import migrations, models, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+
+
+def copy_legacy_ids(apps, schema_editor):
+    # Point every row at its post; rows whose post no longer exists have nothing to point at.
+    # One short transaction per chunk, so neither table stays locked for the whole copy.
+    BlogPost = apps.get_model('blogapp', 'BlogPost')
+    for model_name in ('Like', 'Bookmark'):
+        model = apps.get_model('users', model_name)
+        last_pk = 0
+        while True:
+            with transaction.atomic():
+                rows = list(model.objects.filter(pk__gt=last_pk).order_by('pk')
+                            .values_list('pk', 'legacy_post_id')[:BATCH_SIZE])
+                if not rows:
+                    break
+                last_pk = rows[-1][0]
+                posts = set(BlogPost.objects.filter(pk__in={post_id for _, post_id in rows})
+                            .values_list('pk', flat=True))
+                model.objects.filter(pk__in=[pk for pk, post_id in rows if post_id not in posts]).delete()
+                model.objects.filter(pk__in=[pk for pk, post_id in rows if post_id in posts]).update(
+                    blog_post=models.F('legacy_post_id'))
+
+
+def merge_liked_blogs(apps, schema_editor):
+    # Fold User.liked_blogs into Like so every like lives in one table
+    User = apps.get_model('users', 'User')
+    Like = apps.get_model('users', 'Like')
+    BlogPost = apps.get_model('blogapp', 'BlogPost')
+    through = User.liked_blogs.through
+    counts = (Like.objects.filter(blog_post_id=OuterRef('pk'))
+              .order_by().values('blog_post_id').annotate(total=Count('*')).values('total'))
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            pairs = list(through.objects.filter(pk__gt=last_pk).order_by('pk')
+                         .values_list('pk', 'user_id', 'blogpost_id')[:BATCH_SIZE])
+            if not pairs:
+                break
+            last_pk = pairs[-1][0]
+            now = timezone.now()
+            Like.objects.bulk_create(
+                [Like(user_id=user_id, blog_post_id=post_id, legacy_post_id=post_id, created_at=now)
+                 for _, user_id, post_id in pairs],
+                ignore_conflicts=True,
+            )
+            BlogPost.objects.filter(pk__in={post_id for _, _, post_id in pairs}).update(
+                like_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+    # The copies commit chunk by chunk instead of in one transaction around the whole migration.
+    # Their data has to be in place before 0004 drops legacy_post_id and makes blog_post required,
+    # so unlike comment paths they cannot be left to a backfill job run after the deploy.
+    atomic = False
+
+    dependencies = [
+        ('blogapp', '0005_blogpost_search_index'),
+        ('users', '0002_user_liked_blogs'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(name='bookmark', unique_together=set()),
+        migrations.AlterUniqueTogether(name='like', unique_together=set()),
+        migrations.RenameField(model_name='bookmark', old_name='blog_post_id', new_name='legacy_post_id'),
+        migrations.RenameField(model_name='like', old_name='blog_post_id', new_name='legacy_post_id'),
+        migrations.AddField(
+            model_name='bookmark',
+            name='blog_post',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE,
+                                    related_name='bookmarked_by', to='blogapp.blogpost'),
+        ),
+        migrations.AddField(
+            model_name='like',
+            name='blog_post',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE,
+                                    related_name='likes', to='blogapp.blogpost'),
+        ),
+        migrations.RunPython(copy_legacy_ids, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(name='bookmark', unique_together={('user', 'blog_post')}),
+        migrations.AlterUniqueTogether(name='like', unique_together={('user', 'blog_post')}),
+        migrations.RunPython(merge_liked_blogs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogapp', '0005_blogpost_search_index'),
+        ('users', '0003_like_bookmark_blog_post_fk'),
+    ]
+
+    operations = [
+        migrations.RemoveField(model_name='bookmark', name='legacy_post_id'),
+        migrations.RemoveField(model_name='like', name='legacy_post_id'),
+        migrations.RemoveField(model_name='user', name='liked_blogs'),
+        migrations.AlterField(
+            model_name='bookmark',
+            name='blog_post',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                    related_name='bookmarked_by', to='blogapp.blogpost'),
+        ),
+        migrations.AlterField(
+            model_name='like',
+            name='blog_post',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                    related_name='likes', to='blogapp.blogpost'),
+        ),
+        migrations.AddIndex(
+            model_name='bookmark',
+            index=models.Index(fields=['blog_post', 'created_at'], name='bookmark_post_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(fields=['blog_post', 'created_at'], name='like_post_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_unread(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    Notification = apps.get_model('blogapp', 'Notification')
+    counts = (Notification.objects.filter(recipient_id=OuterRef('pk'), is_read=False)
+              .order_by().values('recipient_id').annotate(total=Count('*')).values('total'))
+    User.objects.update(unread_notifications=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_remove_legacy_post_ids'),
+        ('blogapp', '0009_notification_unread_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='unread_notifications',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_unread, migrations.RunPython.noop),
+    ]
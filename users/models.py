@@ -18,30 +18,67 @@ class User(AbstractUser):
     bio = models.TextField(blank=True)
     photo = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='user')
-    liked_blogs = models.ManyToManyField('blogapp.BlogPost', blank=True, related_name='liked_by')
     created_at = models.DateTimeField(default=timezone.now)
+    # Moves on profile saves; list ETags that embed user fields cover it
+    updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by blogapp.notifications; backfill unread_notification_counts repairs drift
+    unread_notifications = models.PositiveIntegerField(default=0)
+    
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        # Users built from token claims (users.authentication) fill deferred fields from the user cache
+        if getattr(self, '_from_claims', False) and fields is not None and from_queryset is None:
+            from .authentication import get_cached_user
+            cached = get_cached_user(self.pk)
+            if cached is not None:
+                for name in self.get_deferred_fields():
+                    attname = self._meta.get_field(name).attname
+                    setattr(self, attname, getattr(cached, attname))
+                return
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
 
 class Bookmark(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='bookmarks')
-    blog_post_id = models.IntegerField()  # Temporary field
+    blog_post = models.ForeignKey('blogapp.BlogPost', on_delete=models.CASCADE, related_name='bookmarked_by')
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
-        unique_together = ['user', 'blog_post_id']
+        unique_together = ['user', 'blog_post']
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['blog_post', 'created_at'], name='bookmark_post_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} bookmarked post {self.blog_post_id}"
 
 class Like(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='likes')
-    blog_post_id = models.IntegerField()  # Temporary field
+    blog_post = models.ForeignKey('blogapp.BlogPost', on_delete=models.CASCADE, related_name='likes')
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
-        unique_together = ['user', 'blog_post_id']
+        unique_together = ['user', 'blog_post']
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['blog_post', 'created_at'], name='like_post_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} liked post {self.blog_post_id}"
 
+
+class TokenRevocation(models.Model):
+    """A revoked JWT (jti), or every token of user issued before issued_before.
+
+    Authoritative list behind the in-memory filter in users.revocation; rows are
+    dropped by compact_revocations once no token they cover can still be valid."""
+    jti = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='token_revocations')
+    issued_before = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    def __str__(self):
+        if self.jti:
+            return f"Token {self.jti} of {self.user_id}"
+        return f"Tokens of {self.user_id} issued before {self.issued_before}"
@@ -0,0 +1,132 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+from blogapi.bloom import BloomFilter
+from .models import TokenRevocation
+
+# Revoked tokens live in TokenRevocation; each process keeps a Bloom filter of
+# their jtis plus the (rare) per-user cutoffs in memory and picks up new rows
+# every SYNC_INTERVAL seconds, so checking a token normally costs no I/O. Only
+# a filter hit is confirmed against the table. Each sync re-reads the rows
+# created in the last SYNC_OVERLAP seconds as well, since rows can commit out
+# of created_at (and id) order. The filter is rebuilt from the unexpired rows
+# every REBUILD_INTERVAL seconds, which is how compacted rows leave it.
+
+
+def _expiry(token):
+    return datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+
+
+class RevocationList:
+    def __init__(self, capacity, false_positive_rate, sync_interval, rebuild_interval, sync_overlap):
+        self.capacity = capacity
+        self.false_positive_rate = false_positive_rate
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self.sync_overlap = timedelta(seconds=sync_overlap)
+        self.lock = threading.Lock()
+        self.next_sync = self.next_rebuild = 0.0
+        self.reset()
+
+    def reset(self):
+        self.filter = BloomFilter(self.capacity, self.false_positive_rate)
+        self.user_cutoffs = {}
+        self.confirmed = set()
+        self.synced_at = None
+
+    def revoke_token(self, token):
+        """Revoke one access or refresh token until it expires"""
+        jti = token[api_settings.JTI_CLAIM]
+        TokenRevocation.objects.get_or_create(jti=jti, defaults={
+            'user_id': token[api_settings.USER_ID_CLAIM], 'expires_at': _expiry(token),
+        })
+        with self.lock:
+            self.filter.add(jti)
+            self.confirmed.add(jti)
+
+    def revoke_user(self, user):
+        """Revoke every token issued to user so far"""
+        now = timezone.now()
+        # No token issued before now outlives the refresh lifetime
+        TokenRevocation.objects.create(user=user, issued_before=now,
+                                       expires_at=now + settings.SIMPLE_JWT['REFRESH_TOKEN_LIFETIME'])
+        with self.lock:
+            _add_cutoff(self.user_cutoffs, user.pk, now)
+
+    def is_revoked(self, token):
+        self.sync()
+        cutoff = self.user_cutoffs.get(token.get(api_settings.USER_ID_CLAIM))
+        if cutoff is not None and token.get('iat', 0) < cutoff:
+            return True
+        jti = token.get(api_settings.JTI_CLAIM)
+        if jti is None or jti not in self.filter:
+            return False
+        if jti in self.confirmed:
+            return True
+        # A filter hit is either a revoked token or a false positive
+        revoked = TokenRevocation.objects.filter(jti=jti).exists()
+        if revoked:
+            self.confirmed.add(jti)
+        return revoked
+
+    def sync(self, force=False):
+        """Load revocations recorded since the last sync (by any process); rebuild when due"""
+        if not force and time.monotonic() < self.next_sync:
+            return
+        with self.lock:
+            now = time.monotonic()
+            if not force and now < self.next_sync:
+                return
+            synced_at = timezone.now()
+            if force or self.synced_at is None or now >= self.next_rebuild or self.filter.is_full():
+                # Built aside and swapped in at once: is_revoked() never sees a half-filled filter
+                bloom, cutoffs = BloomFilter(self.capacity, self.false_positive_rate), {}
+                self._load(TokenRevocation.objects.filter(expires_at__gt=synced_at), bloom, cutoffs)
+                self.filter, self.user_cutoffs, self.confirmed = bloom, cutoffs, set()
+                self.next_rebuild = now + self.rebuild_interval
+            else:
+                # Adding to the live filter and cutoffs is safe: they only ever gain entries
+                self._load(TokenRevocation.objects.filter(created_at__gte=self.synced_at - self.sync_overlap),
+                           self.filter, self.user_cutoffs)
+            self.synced_at = synced_at
+            self.next_sync = now + self.sync_interval
+
+    @staticmethod
+    def _load(rows, bloom, cutoffs):
+        for row in rows.values('jti', 'user_id', 'issued_before'):
+            if row['jti']:
+                bloom.add(row['jti'])
+            else:
+                _add_cutoff(cutoffs, row['user_id'], row['issued_before'])
+
+
+def _add_cutoff(cutoffs, user_id, issued_before):
+    # iat has whole-second resolution, so the cutoff is the start of the next second: every token
+    # from the revocation's second is rejected, including a login made just after it
+    cutoffs[user_id] = max(cutoffs.get(user_id, 0), int(issued_before.timestamp()) + 1)
+
+
+def compact(batch_size=1000):
+    """Delete revocations that no longer cover a valid token and return how many went"""
+    deleted = 0
+    while True:
+        ids = list(TokenRevocation.objects.filter(expires_at__lte=timezone.now())
+                   .values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += TokenRevocation.objects.filter(id__in=ids).delete()[0]
+
+
+_config = settings.TOKEN_REVOCATION
+revocations = RevocationList(
+    capacity=_config['CAPACITY'],
+    false_positive_rate=_config['FALSE_POSITIVE_RATE'],
+    sync_interval=_config['SYNC_INTERVAL'],
+    rebuild_interval=_config['REBUILD_INTERVAL'],
+    sync_overlap=_config['SYNC_OVERLAP'],
+)
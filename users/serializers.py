@@ -2,6 +2,8 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from datetime import datetime, timedelta    
+from . import login
+from .authentication import add_claims, user_cache
 from .models import User, Bookmark, Like
 User = get_user_model()
 
@@ -69,7 +71,8 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
 
     @classmethod
     def get_token(cls, user):
-        return super().get_token(user)
+        # Role and staff flags ride in the token so requests need no user query
+        return add_claims(super().get_token(user), user)
     
     def validate(self, attrs):
         #extract email and password from request
@@ -79,16 +82,24 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         if not email or not password:   
             raise serializers.ValidationError("Email and password are required")
         
-        #check for email and password
+        #check for email and password, inline (LoginView runs the same check on users.login's pool)
         user = User.objects.filter(email=email).first()
-        if user and user.check_password(password):
-            self.user = user
-        else:
+        valid, upgraded = login.verify_password(password, user.password if user else None)
+        if user is None or not valid or not user.is_active:
             raise serializers.ValidationError("Invalid email or password")
+        if upgraded:
+            user.password = upgraded
+            User.objects.filter(pk=user.pk).update(password=upgraded)
+            user_cache.delete(user.pk)
+        self.user = user
         
+        return self.token_data(user)
+    
+    @classmethod
+    def token_data(cls, user):
         #Generate token
         data = {}
-        refresh_token = self.get_token(user)
+        refresh_token = cls.get_token(user)
         data['refresh'] = str(refresh_token)
         data['access'] = str(refresh_token.access_token)
         data['user'] = UserDetailSerializer(user).data
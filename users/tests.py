@@ -1,3 +1,237 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from blogapp.models import BlogPost
+from . import login
+from .authentication import user_cache
+from .models import User, Like, Bookmark, TokenRevocation
+from .revocation import revocations
+from .views import BookmarkDeleteView, LikeDeleteView
+
+
+class LikeBookmarkTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', email='reader@example.com', password='abc123')
+        cls.posts = [BlogPost.objects.create(author=cls.user, title=f'Post {i}', content='Body', status='published')
+                     for i in range(5)]
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_list_hydrates_posts_with_one_join(self):
+        for post in self.posts:
+            Like.objects.create(user=self.user, blog_post=post)
+            Bookmark.objects.create(user=self.user, blog_post=post)
+        for url in ('/api/likes/', '/api/bookmarks/'):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.data['count'], 5)
+            self.assertEqual({item['blog_post_slug'] for item in response.data['results']},
+                             {post.slug for post in self.posts})
+            # count + one joined page query
+            self.assertEqual(len(queries), 2)
+
+    def test_create_and_delete_move_the_counter(self):
+        post = self.posts[0]
+        response = self.client.post('/api/likes/create/', {'blog_post': post.id})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['blog_post_title'], 'Post 0')
+        post.refresh_from_db()
+        self.assertEqual(post.like_count, 1)
+        self.assertEqual(list(post.likes.values_list('user', flat=True)), [self.user.id])
+        self.assertEqual(self.client.delete(f'/api/likes/{post.id}/delete/').status_code, 204)
+        post.refresh_from_db()
+        self.assertEqual(post.like_count, 0)
+
+    def test_racing_deletes_decrement_once(self):
+        post = self.posts[0]
+        for model, view, field in ((Like, LikeDeleteView, 'like_count'),
+                                   (Bookmark, BookmarkDeleteView, 'bookmark_count')):
+            model.objects.create(user=self.user, blog_post=post)
+            # Counts this like/bookmark and one from another reader
+            BlogPost.objects.filter(pk=post.pk).adjust_counter(field, 2)
+            # Both requests looked the row up before either deleted it
+            fetched = [model.objects.get(user=self.user, blog_post=post) for _ in range(2)]
+            for instance in fetched:
+                view().perform_destroy(instance)
+            post.refresh_from_db()
+            self.assertEqual(getattr(post, field), 1)
+
+    def test_deleting_a_post_removes_its_likes(self):
+        Like.objects.create(user=self.user, blog_post=self.posts[1])
+        self.posts[1].delete()
+        self.assertFalse(Like.objects.exists())
+
+
+class StatelessAuthTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', email='reader@example.com', password='abc123')
+        cls.staff = User.objects.create_user(username='staff', email='staff@example.com', password='abc123',
+                                             is_staff=True)
+
+    def setUp(self):
+        user_cache.clear()
+
+    def login(self, email):
+        response = self.client.post('/api/auth/login/', {'email': email, 'password': 'abc123'})
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.json()["access"]}')
+
+    def user_queries(self, path):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        return response, [q for q in queries if 'FROM "users_user"' in q['sql']]
+
+    def test_requests_are_authenticated_from_claims(self):
+        self.login('staff@example.com')
+        response, queries = self.user_queries('/api/posts/admin/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+        self.login('reader@example.com')
+        self.assertEqual(self.client.get('/api/posts/admin/').status_code, 403)
+
+    def test_full_user_comes_from_the_cache(self):
+        self.login('reader@example.com')
+        response, queries = self.user_queries('/api/users/update/')
+        self.assertEqual((response.data['email'], len(queries)), ('reader@example.com', 1))
+        response, queries = self.user_queries('/api/users/update/')
+        self.assertEqual(queries, [])
+
+        self.client.patch('/api/users/update/', {'bio': 'Hello'})
+        self.assertEqual(self.client.get('/api/users/update/').data['bio'], 'Hello')
+
+    def test_tokens_without_claims_fall_back_to_the_cache(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.assertEqual(len(self.user_queries('/api/likes/')[1]), 1)
+        response, queries = self.user_queries('/api/likes/')
+        self.assertEqual((response.status_code, queries), (200, []))
+
+
+class TokenRevocationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', email='reader@example.com', password='abc123')
+        cls.staff = User.objects.create_user(username='staff', email='staff@example.com', password='abc123',
+                                             is_staff=True)
+
+    def setUp(self):
+        revocations.sync(force=True)
+
+    def tearDown(self):
+        # The filter outlives the test's rolled-back rows
+        revocations.reset()
+
+    def login(self, email):
+        response = self.client.post('/api/auth/login/', {'email': email, 'password': 'abc123'})
+        return response.json()['access'], response.json()['refresh']
+
+    def test_logout_revokes_both_tokens_without_per_request_queries(self):
+        access, refresh = self.login('reader@example.com')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/api/posts/admin/').status_code, 403)
+        self.assertFalse([q for q in queries if 'users_tokenrevocation' in q['sql']])
+
+        self.assertEqual(self.client.post('/api/auth/logout/', {'refresh': refresh}).status_code, 200)
+        self.assertEqual(self.client.get('/api/likes/').status_code, 401)
+        self.assertEqual(TokenRevocation.objects.count(), 2)
+
+    def test_other_processes_pick_revocations_up_on_sync(self):
+        access, _ = self.login('reader@example.com')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        token = AccessToken(access)
+        # Recorded by another process: invisible here until the next sync
+        TokenRevocation.objects.create(jti=token['jti'], user=self.user, expires_at=timezone.now() + timedelta(hours=1))
+        self.assertEqual(self.client.get('/api/likes/').status_code, 200)
+        revocations.sync(force=True)
+        self.assertEqual(self.client.get('/api/likes/').status_code, 401)
+
+    def test_admin_revokes_every_token_of_a_user(self):
+        old_access = str(AccessToken.for_user(self.user))
+        staff_access, _ = self.login('staff@example.com')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {staff_access}')
+        self.assertEqual(self.client.post(f'/api/users/{self.user.id}/revoke-tokens/').status_code, 200)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {old_access}')
+        self.assertEqual(self.client.get('/api/likes/').status_code, 401)
+
+    def test_user_cutoff_covers_every_token_from_the_same_second(self):
+        revocations.revoke_user(self.user)
+        second = int(TokenRevocation.objects.get().issued_before.timestamp())
+        token = AccessToken.for_user(self.user)
+        token['iat'] = second
+        self.assertTrue(revocations.is_revoked(token))
+        token['iat'] = second + 1
+        self.assertFalse(revocations.is_revoked(token))
+
+    def test_sync_picks_up_rows_that_commit_late(self):
+        token = AccessToken.for_user(self.user)
+        revocations.sync(force=True)
+        # Created before the last sync but committed after it
+        row = TokenRevocation.objects.create(jti=token['jti'], user=self.user,
+                                             expires_at=timezone.now() + timedelta(hours=1))
+        TokenRevocation.objects.filter(pk=row.pk).update(created_at=revocations.synced_at - timedelta(seconds=10))
+        revocations.next_sync = 0
+        self.assertTrue(revocations.is_revoked(token))
+
+    def test_compaction_drops_expired_revocations(self):
+        TokenRevocation.objects.create(jti='old', user=self.user, expires_at=timezone.now() - timedelta(seconds=1))
+        TokenRevocation.objects.create(jti='live', user=self.user, expires_at=timezone.now() + timedelta(hours=1))
+        out = StringIO()
+        call_command('compact_revocations', stdout=out)
+        self.assertIn('Deleted 1 expired revocation(s)', out.getvalue())
+        revocations.sync(force=True)
+        self.assertNotIn('old', revocations.filter)
+        self.assertIn('live', revocations.filter)
+
+
+class LoginTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', email='reader@example.com', password='abc123')
+
+    def test_login_checks_credentials(self):
+        response = self.client.post('/api/auth/login/', {'email': 'reader@example.com', 'password': 'abc123'},
+                                    format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['username'], 'reader')
+        for data, expected in (({'email': 'reader@example.com', 'password': 'wrong'}, 401),
+                               ({'email': 'nobody@example.com', 'password': 'abc123'}, 401),
+                               ({'email': 'reader@example.com'}, 400)):
+            self.assertEqual(self.client.post('/api/auth/login/', data).status_code, expected)
+        for data in ({'email': 'reader@example.com', 'password': 123}, {'email': ['a'], 'password': 'abc123'}, []):
+            self.assertEqual(self.client.post('/api/auth/login/', data, format='json').status_code, 400)
+
+    def test_outdated_hashes_are_upgraded_on_login(self):
+        hasher = PBKDF2PasswordHasher()
+        User.objects.filter(pk=self.user.pk).update(password=hasher.encode('abc123', hasher.salt(), iterations=1000))
+        response = self.client.post('/api/auth/login/', {'email': 'reader@example.com', 'password': 'abc123'})
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith(f'pbkdf2_sha256${hasher.iterations}$'))
+        self.assertTrue(self.user.check_password('abc123'))
+
+    def test_full_pool_answers_503(self):
+        pool = login.PasswordHasherPool(workers=1, queue_size=0)
+        release = threading.Event()
+        pool.submit(release.wait)
+        try:
+            with mock.patch.object(login, 'hasher_pool', pool):
+                response = self.client.post('/api/auth/login/', {'email': 'reader@example.com',
+                                                                 'password': 'abc123'})
+        finally:
+            release.set()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
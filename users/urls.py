@@ -5,10 +5,12 @@ urlpatterns = [
     # Authentication
     path('auth/register/', views.RegistrationView.as_view(), name='register'),
     path('auth/login/', views.LoginView.as_view(), name='login'),
+    path('auth/logout/', views.logout, name='logout'),
     path('users/forgot-password/', views.forgot_password, name='forgot-password'),
     
     # User management
     path('users/<int:id>/', views.UserDetailView.as_view(), name='user-detail'),
+    path('users/<int:id>/revoke-tokens/', views.revoke_user_tokens, name='revoke-user-tokens'),
     path('users/update/', views.ProfileView.as_view(), name='profile-update'),
     
     # Bookmarks
@@ -1,14 +1,27 @@
+import json
+
+from django.conf import settings
+from django.http import JsonResponse, QueryDict
 from django.shortcuts import render
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from .models import User, Bookmark, Like
 from rest_framework import generics, status
 from .serializers import UserSerializer, UserDetailSerializer, CustomTokenObtainPairSerializer, BookmarkSerializer, LikeSerializer
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.response import Response
 from django.contrib.auth import authenticate
 from rest_framework.exceptions import ValidationError
 from rest_framework.decorators import api_view, permission_classes
 from django.shortcuts import get_object_or_404
+from django.db import transaction
+from blogapp.models import BlogPost
+from . import login
+from .revocation import revocations
 
 #Views for registration 
 class RegistrationView(generics.CreateAPIView):
@@ -26,33 +39,68 @@ class RegistrationView(generics.CreateAPIView):
         }, status=status.HTTP_201_CREATED)
     
 #Views for login and token generation
-class LoginView(TokenObtainPairView):
-    serializer_class = CustomTokenObtainPairSerializer
-    permission_classes = [AllowAny]
+@method_decorator(csrf_exempt, name='dispatch')
+class LoginView(View):
+    """POST /api/auth/login - Exchange email and password for tokens.
 
-    def post(self, request, *args, **kwargs):
-        required_fields = {'email', 'password'}
-        if not required_fields.issubset(request.data):
-            return Response(
-                {"error": "Email and password are required."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+    Async: the password hash is checked on users.login's bounded thread pool, so
+    a login storm cannot tie up the server's workers. When the pool is full the
+    view answers 503 with Retry-After instead of queueing."""
+
+    async def post(self, request, *args, **kwargs):
+        if request.content_type == 'application/json':
+            try:
+                data = json.loads(request.body or b'{}')
+            except ValueError:
+                data = None
+        else:
+            data = request.POST
+        if not isinstance(data, (dict, QueryDict)):
+            data = {}
+        email, password = data.get('email'), data.get('password')
+        if not isinstance(email, str) or not isinstance(password, str) or not email or not password:
+            return JsonResponse({"error": "Email and password are required."}, status=status.HTTP_400_BAD_REQUEST)
 
-        serializer = self.get_serializer(data=request.data)
         try:
-            serializer.is_valid(raise_exception=True)
-        except Exception:
-            return Response(
-                {"error": "Invalid email or password."},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
+            user = await login.authenticate(email, password)
+        except login.HasherBusy:
+            response = JsonResponse({"error": "Too many logins in progress, try again shortly."},
+                                    status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response['Retry-After'] = str(settings.LOGIN_HASHING['RETRY_AFTER'])
+            return response
+        if user is None:
+            return JsonResponse({"error": "Invalid email or password."}, status=status.HTTP_401_UNAUTHORIZED)
 
-        return Response({
-            "access": serializer.validated_data['access'],
-            "refresh": serializer.validated_data['refresh'],
-            "user": serializer.validated_data['user'],
+        return JsonResponse({
+            **CustomTokenObtainPairSerializer.token_data(user),
             "message": "Login successful"
         }, status=status.HTTP_200_OK)
+    
+#Logout and token revocation
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def logout(request):
+    """POST /api/auth/logout - Revoke the access token in use and, if sent, the refresh token"""
+    refresh = None
+    if request.data.get('refresh'):
+        try:
+            refresh = RefreshToken(request.data['refresh'])
+        except TokenError:
+            return Response({'error': 'Invalid refresh token'}, status=status.HTTP_400_BAD_REQUEST)
+        if refresh[jwt_settings.USER_ID_CLAIM] != request.user.pk:
+            return Response({'error': 'Invalid refresh token'}, status=status.HTTP_400_BAD_REQUEST)
+    revocations.revoke_token(request.auth)
+    if refresh is not None:
+        revocations.revoke_token(refresh)
+    return Response({'message': 'Logged out'}, status=status.HTTP_200_OK)
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def revoke_user_tokens(request, id):
+    """POST /api/users/<id>/revoke-tokens - Revoke every token issued to a user so far (admin only)"""
+    user = get_object_or_404(User.objects.only('id'), id=id)
+    revocations.revoke_user(user)
+    return Response({'message': 'Tokens revoked'}, status=status.HTTP_200_OK)
 
 #Views for user profile
 class ProfileView(generics.RetrieveUpdateAPIView):
@@ -60,7 +108,10 @@ class ProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_object(self):
-        return self.request.user
+        # Reads can use the request user (filled from the user cache); writes start from the current row
+        if self.request.method == 'GET':
+            return self.request.user
+        return User.objects.get(pk=self.request.user.pk)
     
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -90,14 +141,18 @@ class BookmarkListView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Bookmark.objects.filter(user=self.request.user)
+        # Title and slug come from one join rather than a lookup per bookmark
+        return (Bookmark.objects.filter(user=self.request.user).select_related('blog_post')
+                .only('id', 'created_at', 'blog_post', 'blog_post__title', 'blog_post__slug'))
 
 class BookmarkCreateView(generics.CreateAPIView):
     serializer_class = BookmarkSerializer
     permission_classes = [IsAuthenticated]
     
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        with transaction.atomic():
+            bookmark = serializer.save(user=self.request.user)
+            BlogPost.objects.filter(pk=bookmark.blog_post_id).adjust_counter('bookmark_count', 1)
 
 class BookmarkDeleteView(generics.DestroyAPIView):
     queryset = Bookmark.objects.all()
@@ -105,6 +160,13 @@ class BookmarkDeleteView(generics.DestroyAPIView):
     
     def get_object(self):
         return get_object_or_404(Bookmark, user=self.request.user, blog_post_id=self.kwargs['post_id'])
+    
+    def perform_destroy(self, instance):
+        # A concurrent delete may already have removed the row and decremented
+        with transaction.atomic():
+            deleted, _ = Bookmark.objects.filter(pk=instance.pk).delete()
+            if deleted:
+                BlogPost.objects.filter(pk=instance.blog_post_id).adjust_counter('bookmark_count', -deleted)
 
 #Views for likes
 class LikeListView(generics.ListAPIView):
@@ -112,14 +174,17 @@ class LikeListView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Like.objects.filter(user=self.request.user)
+        return (Like.objects.filter(user=self.request.user).select_related('blog_post')
+                .only('id', 'created_at', 'blog_post', 'blog_post__title', 'blog_post__slug'))
 
 class LikeCreateView(generics.CreateAPIView):
     serializer_class = LikeSerializer
     permission_classes = [IsAuthenticated]
     
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        with transaction.atomic():
+            like = serializer.save(user=self.request.user)
+            BlogPost.objects.filter(pk=like.blog_post_id).adjust_counter('like_count', 1)
 
 class LikeDeleteView(generics.DestroyAPIView):
     queryset = Like.objects.all()
@@ -127,6 +192,13 @@ class LikeDeleteView(generics.DestroyAPIView):
     
     def get_object(self):
         return get_object_or_404(Like, user=self.request.user, blog_post_id=self.kwargs['post_id'])
+    
+    def perform_destroy(self, instance):
+        # A concurrent delete may already have removed the row and decremented
+        with transaction.atomic():
+            deleted, _ = Like.objects.filter(pk=instance.pk).delete()
+            if deleted:
+                BlogPost.objects.filter(pk=instance.blog_post_id).adjust_counter('like_count', -deleted)
 
 #Password reset view
 @api_view(['POST'])